@@ -1,57 +1,164 @@
+import atexit
+import hmac
+import logging
 import os
 import json
+import time
 from datetime import datetime
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlsplit
 
-from flask import Flask, render_template, request, flash, redirect, url_for, jsonify, session, g, Response
+from flask import Flask, render_template, request, flash, redirect, url_for, jsonify, session, g, Response, template_rendered, abort
+from flask.logging import default_handler
+from jinja2 import ChoiceLoader, FileSystemLoader, PrefixLoader, pass_context
+from markupsafe import Markup
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 from openai import OpenAI
 
+from archive import Archive
+from compression import CompressionMiddleware
+from export import csv_stream, xlsx_stream
+from html_optimize import HtmlOptimizer
+from i18n import load_catalog
+from tenants import TenantRegistry, normalize_host
+from tracing import JsonlSpanExporter, SPAN_KIND_CLIENT, Tracer, TracingMiddleware, install_log_record_factory
+from uptime import UptimeProber, summarize as summarize_uptime
+
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "your_secret_agency_key")  # Required for flash + sessions
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+# Response compression (brotli/gzip); disable with COMPRESSION_ENABLED=0 if a proxy already does it.
+if os.environ.get("COMPRESSION_ENABLED", "1") == "1":
+    app.wsgi_app = CompressionMiddleware(
+        app.wsgi_app,
+        min_size=int(os.environ.get("COMPRESS_MIN_SIZE", "1024")),
+        cache_bytes=int(os.environ.get("COMPRESS_CACHE_BYTES", str(8 * 1024 * 1024))),
+    )
+
+# -------------------------
+# Request tracing (X-Trace-Id on every response; sampled spans -> data/traces/spans-YYYYMMDD.jsonl)
+# -------------------------
+TRACE_ENABLED = os.environ.get("TRACE_ENABLED", "1") == "1"
+
+span_exporter = JsonlSpanExporter(
+    os.environ.get("TRACE_DIR", os.path.join(app.root_path, "data", "traces")),
+    service_name=os.environ.get("TRACE_SERVICE_NAME", "skylane-web"),
+    batch_size=int(os.environ.get("TRACE_BATCH_SIZE", "512")),
+    flush_interval=float(os.environ.get("TRACE_FLUSH_INTERVAL", "2")),
+    retention_days=float(os.environ.get("TRACE_RETENTION_DAYS", "14")),
+)
+tracer = Tracer(
+    sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", "0.01")),
+    exporter=span_exporter,
+    # Set to 1 only behind upstreams whose traceparent sampled flag may decide what gets recorded.
+    trust_parent_sampled=os.environ.get("TRACE_TRUST_PARENT_SAMPLED", "0") == "1",
+)
+atexit.register(span_exporter.close)
+
+# Log lines carry the request's trace id (grep it in the span files).
+install_log_record_factory()
+default_handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s in %(module)s [trace %(trace_id)s]: %(message)s"))
+if not logging.getLogger().handlers:
+    # Same handler for the helper modules' loggers, unless the server configured logging itself.
+    for _name in ("archive", "batching", "i18n", "tenants", "tracing", "uptime"):
+        logging.getLogger(_name).addHandler(default_handler)
+
+if TRACE_ENABLED:
+    # Outermost, so the root span also covers compression and streamed bodies.
+    app.wsgi_app = TracingMiddleware(
+        app.wsgi_app, tracer,
+        slow_ms=float(os.environ.get("TRACE_SLOW_MS", "1000")),
+        logger=app.logger,
+    )
+
+
+@app.before_request
+def name_trace():
+    trace = tracer.current()
+    if trace is not None and trace.sampled and request.url_rule is not None:
+        trace.root.name = f"{request.method} {request.url_rule.rule}"
+        trace.root.set_attribute("http.route", request.url_rule.rule)
+        trace.root.set_attribute("server.address", request.host)
+
+
 # -------------------------
 # Language (default: Chinese)
 # -------------------------
-SUPPORTED_LANGS = {"zh", "en"}
+# All texts live in locales/<lang>.json, compiled into locales/messages.bin (python i18n.py compile;
+# recompiled at startup when a source is newer). Adding a language = adding a catalog file.
+messages = load_catalog(os.environ.get("LOCALES_DIR", os.path.join(app.root_path, "locales")))
+SUPPORTED_LANGS = set(messages.languages)
 DEFAULT_LANG = "zh"
 
 
+@tracer.wrap()
 def get_lang(default: str = DEFAULT_LANG) -> str:
     """
     Language selection order:
-      1) ?lang= (en|zh)  -> persisted to session
+      1) ?lang= (any compiled language or alias, e.g. zh-CN)  -> persisted to session
       2) session['lang']
       3) default (zh)
+    Unknown languages fall back to the catalogs' source language (en).
     """
-    raw = (request.args.get("lang") or session.get("lang") or default or DEFAULT_LANG).strip().lower()
-    lang = "zh" if raw in ("zh", "cn", "zh-cn", "zh-hans") else "en"
+    raw = request.args.get("lang") or session.get("lang") or default or DEFAULT_LANG
+    lang = messages.normalize(raw, messages.source_lang)
     session["lang"] = lang
     g.lang = lang
     return lang
 
 
+# Templates: {{ _("English text") }} / {% trans %} look up the page's locale (the "i18n" context var).
+# Same semantics as Jinja's "newstyle" gettext (catalog text is markup, %(name)s placeholders), but
+# the common no-placeholder case is served from a per-(language, message) cache of ready Markup.
+_template_messages = {}
+
+
+@pass_context
+def _template_gettext(context, message, **variables):
+    i18n = context["i18n"]
+    if variables:
+        return Markup(i18n.gettext(message)) % variables
+    key = (i18n.lang, message)
+    rv = _template_messages.get(key)
+    if rv is None:
+        rv = _template_messages[key] = Markup(i18n.gettext(message)) % {}
+    return rv
+
+
+@pass_context
+def _template_ngettext(context, singular, plural, num, **variables):
+    variables.setdefault("num", num)
+    return Markup(context["i18n"].ngettext(singular, plural, num)) % variables
+
+
+app.jinja_env.add_extension("jinja2.ext.i18n")
+app.jinja_env.newstyle_gettext = True
+app.jinja_env.globals.update(gettext=_template_gettext, _=_template_gettext, ngettext=_template_ngettext)
+
+
 @app.context_processor
 def inject_lang_helpers():
     def switch_lang_url(target_lang: str) -> str:
-        tl = (target_lang or "").strip().lower()
-        tl = "zh" if tl in ("zh", "cn", "zh-cn", "zh-hans") else "en"
-
         args = request.args.to_dict(flat=True)
-        args["lang"] = tl
+        args["lang"] = messages.normalize(target_lang, messages.source_lang)
         qs = urlencode(args)
         return request.path + ("?" + qs if qs else "")
 
-    _lang = getattr(g, "lang", session.get("lang", DEFAULT_LANG))
+    # Only touch the session when needed: reading it adds "Vary: Cookie" (bad for cacheable fragments).
+    i18n = messages.view(g.lang if "lang" in g else session.get("lang", DEFAULT_LANG))
+    _lang = i18n.lang
+    tenant = get_tenant()
     return {
         "switch_lang_url": switch_lang_url,
         "lang": _lang,
-        "support_policy": get_support_policy(_lang),
-        "addons": localize_addons(_lang),
-        "language_tiers": localize_language_tiers(_lang),
-        "banking_service_note": BANKING_SERVICE_NOTE.get(_lang, BANKING_SERVICE_NOTE["en"]),
+        "i18n": i18n,
+        "languages": messages.views(),
+        "support_policy": tenant.view("support_policy", _lang, lambda: get_support_policy(_lang)),
+        "addons": tenant.view("addons", _lang, lambda: localize_addons(_lang)),
+        "language_tiers": tenant.view("language_tiers", _lang, lambda: localize_language_tiers(_lang)),
+        "banking_service_note": i18n.get("note.banking_service", ""),
+        "tenant_theme": tenant.theme,
     }
 # === OpenAI client ===
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
@@ -60,16 +167,12 @@ client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 ENABLE_AI_CHAT = True
 ENABLE_SMART_RFQ = True
 
-# --- Central Data for Projects (bilingual desc) ---
+# --- Central Data for Projects (desc: "project.<id>.desc" in locales/<lang>.json) ---
 PROJECTS = [
     {
         "id": "factory",
         "title": "工厂B2B出口 - Factory B2B Export ",
         "category": "Manufacturing",
-        "desc": {
-            "en": "Heavy machinery and tools export site. Focus on technical specs, certifications, and factory tour video.",
-            "zh": "重型机械和手工具出口型网站，重点展示技术参数、认证资质和工厂参观内容。"
-        },
         "url": "https://factory.skylaneai.com/",
         "icon": "fa-industry"
     },
@@ -77,10 +180,6 @@ PROJECTS = [
         "id": "tea",
         "title": "高端茶叶品牌 - Premium Tea Brand",
         "category": "Consumer Goods",
-        "desc": {
-            "en": "Luxury storytelling site for a Hangzhou tea farm. Includes origin stories and premium packaging showcase.",
-            "zh": "杭州茶园的高端品牌故事网站，结合产地故事与精致礼盒包装展示。"
-        },
         "url": "https://tea.skylaneai.com/",
         "icon": "fa-leaf"
     },
@@ -88,10 +187,6 @@ PROJECTS = [
         "id": "sourcing",
         "title": "地平线采购 - Horizon Sourcing",
         "category": "Service Agency",
-        "desc": {
-            "en": "Futuristic sourcing control center for importers: live-like process visuals, QC timelines, and logistics tracking screens.",
-            "zh": "面向海外买家的未来感采购控制中枢网站，以短视频和可视化流程展示选品、质检与物流全流程。"
-        },
         "url": "https://sourcing.skylaneai.com/",
         "icon": "fa-handshake"
     },
@@ -99,21 +194,13 @@ PROJECTS = [
         "id": "shop",
         "title": "商店 - SkyLane Shop",
         "category": "E-Commerce",
-        "desc": {
-            "en": "Full B2C experience with shopping basket, user accounts, and checkout forms.",
-            "zh": "完整的 B2C 独立站体验，包含购物车、用户账号和结算流程。"
-        },
         "url": "https://shop.skylaneai.com/",
         "icon": "fa-cart-shopping"
     },
-        {
+    {
         "id": "chuanghua",
         "title": "窗花手工艺小店 - Paper-cut Craft Shop",
         "category": "Handmade / DTC",
-        "desc": {
-            "zh": "艺术窗花独立站演示：商品目录、购物车、下单、留言、后台管理（改价/上新/下架）。",
-            "en": "Artistic craft shop demo: catalog, cart, checkout, messages, and admin (price/update/hide)."
-        },
         "url": "https://chuanghua-shop.onrender.com/",
         "icon": "fa-scissors"
     },
@@ -123,210 +210,31 @@ PROJECTS = [
 # -------------------------
 # Cost Estimator: Language tiers (applies to all base website packages)
 # Base package prices include CN + EN. Tier modifiers apply when more languages are required.
+# Names: "tier.<id>.name"; the banking note: "note.banking_service".
 # -------------------------
 LANGUAGE_TIERS = [
-    {"id": "starter", "name": {"en": "Starter", "zh": "Starter"}, "max_lang": 3, "add_price": 0},
-    {"id": "business", "name": {"en": "Business", "zh": "Business"}, "max_lang": 5, "add_price": 1500},
-    {"id": "pro", "name": {"en": "Pro", "zh": "Pro"}, "max_lang": 10, "add_price": 3000},
+    {"id": "starter", "max_lang": 3, "add_price": 0},
+    {"id": "business", "max_lang": 5, "add_price": 1500},
+    {"id": "pro", "max_lang": 10, "add_price": 3000},
 ]
 
-BANKING_SERVICE_NOTE = {
-    "en": "Banking / payment-related services are handled individually and quoted separately.",
-    "zh": "银行/收款相关服务为单独评估与单独报价。"
-}
-
 # -------------------------
 # Packages (realistic pricing)
+# Texts: "package.<id>.name|delivery|bullets|excluded|ai_options"
 # -------------------------
 PACKAGES = [
-    {
-        "id": "pkg_factory",
-        "project_id": "factory",
-        "name": {"en": "Factory Export Starter Site", "zh": "工厂出口官网 · 标准版"},
-        "price": {"en": "880元", "zh": "880元"},
-        "delivery": {"en": "7–10 business days", "zh": "7–10 个工作日"},
-        "recommended": False,
-        "bullets": {
-            "en": [
-                "Based on: Factory B2B export demo",
-                "Up to 5 pages (Home, About, Products, QC, Contact)",
-                "Bilingual EN / CN structure",
-                "RFQ / inquiry form (to your email)"
-            ],
-            "zh": [
-                "基于：工厂 B2B 出口演示网站",
-                "最多 5 个页面（首页 / 公司介绍 / 产品列表 / 质量控制 / 联系我们）",
-                "中英多语结构",
-                "在线询盘表单（自动发送到您的邮箱）"
-            ]
-        },
-        "excluded": {
-            "en": [
-                "Domain/hosting fees (billed by providers)",
-                "Paid plugins/tools (CRM*, paid chat tools, etc.)",
-                "Large-scale product data entry (can be quoted separately)"
-            ],
-            "zh": [
-                "域名/主机费用（由供应商收取）",
-                "第三方付费工具（CRM*、付费客服等）",
-                "大批量产品录入（可单独报价）"
-            ]
-        },
-        "ai_options": {
-            "en": [
-                "Optional: AI Smart RFQ** – expand buyer notes into a full RFQ**",
-                "Optional: AI Export Assistant chat widget"
-            ],
-            "zh": [
-                "可选：AI 智能 RFQ** – 把买家备注扩展为完整询盘",
-                "可选：AI 出口助手聊天窗口"
-            ]
-        }
-    },
-    {
-        "id": "pkg_sourcing",
-        "project_id": "sourcing",
-        "name": {"en": "Sourcing & Service Website", "zh": "一站式采购服务官网"},
-        "price": {"en": "1280元", "zh": "1280元"},
-        "delivery": {"en": "10–14 business days", "zh": "10–14 个工作日"},
-        "recommended": True,
-        "bullets": {
-            "en": [
-                "Based on: Horizon Sourcing demo",
-                "Service pages: sourcing, QC, logistics and workflow",
-                "Case studies / project timeline sections",
-                "Multi-step RFQ** form for better lead quality"
-            ],
-            "zh": [
-                "基于：Horizon Sourcing 演示站",
-                "完整服务页面：采购 / 质检 / 物流及流程说明",
-                "案例展示与项目时间线模块",
-                "多步骤询盘表单，收集更完整项目信息"
-            ]
-        },
-        "excluded": {
-            "en": [
-                "Domain/hosting fees (billed by providers)",
-                "Paid analytics/CRM* subscriptions",
-                "Custom ERP*** integrations (quoted separately)"
-            ],
-            "zh": [
-                "域名/主机费用（由供应商收取）",
-                "付费统计/CRM*订阅",
-                "定制 ERP***/系统对接（需单独报价）"
-            ]
-        },
-        "ai_options": {
-            "en": [
-                "Optional: AI Smart RFQ** for complex projects",
-                "Optional: AI Export Assistant for 24/7 pre-sales questions",
-                "Optional: AI Market Navigator (basic market suggestions)"
-            ],
-            "zh": [
-                "可选：AI 智能 RFQ**（适合复杂项目）",
-                "可选：AI 出口助手（7x24 小时预售问答）",
-                "可选：AI 市场导航（基础市场建议）"
-            ]
-        }
-    },
-    {
-        "id": "pkg_tea",
-        "project_id": "tea",
-        "name": {"en": "Brand Storytelling Site (Tea)", "zh": "品牌故事官网（以茶叶为例）"},
-        "price": {"en": "980元", "zh": "980元"},
-        "delivery": {"en": "7–10 business days", "zh": "7–10 个工作日"},
-        "recommended": False,
-        "bullets": {
-            "en": [
-                "Based on: Premium Tea Brand",
-                "Story-driven layout with photos and short videos",
-                "Origin story, process, packaging and gallery sections",
-                "Lead capture form for distributors and importers"
-            ],
-            "zh": [
-                "基于：高端茶叶品牌演示站",
-                "以图片与短视频为主的品牌故事布局",
-                "原产地故事 / 制作过程 / 包装展示 / 图库模块",
-                "用于收集代理商与进口商信息的表单"
-            ]
-        },
-        "excluded": {
-            "en": [
-                "Professional photo/video shooting",
-                "Domain/hosting fees (billed by providers)",
-                "Paid ad campaigns (can be quoted separately)"
-            ],
-            "zh": [
-                "专业拍摄（照片/视频）",
-                "域名/主机费用（由供应商收取）",
-                "广告投放服务（可单独报价）"
-            ]
-        },
-        "ai_options": {
-            "en": [
-                "Optional: AI Export Assistant for brand Q&A",
-                "Optional: AI Product Advisor for tea selection help"
-            ],
-            "zh": [
-                "可选：AI 出口助手，回答品牌相关问题",
-                "可选：AI 产品顾问，帮买家选择茶叶款式"
-            ]
-        }
-    },
-    {
-        "id": "pkg_shop",
-        "project_id": "shop",
-        "name": {"en": "Export E-Commerce Shop", "zh": "出口型独立商城"},
-        "price": {"en": "1980元", "zh": "1980元"},
-        "delivery": {"en": "3–5 weeks (depends on catalog size)", "zh": "3–5 周（取决于产品数量）"},
-        "recommended": False,
-        "bullets": {
-            "en": [
-                "Based on: SkyLane Shop (basket + login + checkout)",
-                "Product catalog, shopping cart and demo checkout flow",
-                "User account area with sample orders",
-                "Ready for payment integration (Stripe/PayPal/bank transfer)"
-            ],
-            "zh": [
-                "基于：SkyLane 商城演示站（含购物车 / 登录 / 结算）",
-                "产品目录、购物车及演示结算流程",
-                "带示例订单的用户中心页面",
-                "可扩展接入支付（Stripe/PayPal/银行转账）"
-            ]
-        },
-        "excluded": {
-            "en": [
-                "Payment provider fees and business verification",
-                "Complex shipping/tax automation (quoted separately)",
-                "Large-scale product import/ERP*** sync (quoted separately)"
-            ],
-            "zh": [
-                "支付平台手续费及商户资质认证",
-                "复杂运费/税务自动化（需单独报价）",
-                "大规模商品导入/ERP*** 同步（需单独报价）"
-            ]
-        },
-        "ai_options": {
-            "en": [
-                "Optional: AI Product Advisor to recommend products",
-                "Optional: AI Export Assistant for order and shipping questions"
-            ],
-            "zh": [
-                "可选：AI 产品顾问，为买家推荐合适产品",
-                "可选：AI 出口助手，回答订单与物流问题"
-            ]
-        }
-    },
+    {"id": "pkg_factory", "project_id": "factory", "price": "880元", "recommended": False},
+    {"id": "pkg_sourcing", "project_id": "sourcing", "price": "1280元", "recommended": True},
+    {"id": "pkg_tea", "project_id": "tea", "price": "980元", "recommended": False},
+    {"id": "pkg_shop", "project_id": "shop", "price": "1980元", "recommended": False},
 ]
 
 # -------------------------
-# Dashboard demo data
+# Dashboard demo data (names: "dashboard.site.<id>.name", lead projects: "dashboard.lead.<id>.project")
 # -------------------------
 DASHBOARD_SITES = [
     {
         "id": "factory",
-        "name_en": "Factory B2B Export",
-        "name_zh": "工厂 B2B 出口官网",
         "url": "https://factory.skylaneai.com/",
         "type": "B2B",
         "status": "online",
@@ -336,8 +244,6 @@ DASHBOARD_SITES = [
     },
     {
         "id": "tea",
-        "name_en": "Premium Tea Brand",
-        "name_zh": "高端茶叶品牌官网",
         "url": "https://tea.skylaneai.com/",
         "type": "Brand",
         "status": "online",
@@ -347,8 +253,6 @@ DASHBOARD_SITES = [
     },
     {
         "id": "sourcing",
-        "name_en": "Horizon Sourcing",
-        "name_zh": "Horizon 采购服务网站",
         "url": "https://sourcing.skylaneai.com/",
         "type": "Service",
         "status": "online",
@@ -358,8 +262,6 @@ DASHBOARD_SITES = [
     },
     {
         "id": "shop",
-        "name_en": "SkyLane Shop (B2C)",
-        "name_zh": "SkyLane B2C 商城",
         "url": "https://shop.skylaneai.com/",
         "type": "E-Commerce",
         "status": "online",
@@ -369,65 +271,80 @@ DASHBOARD_SITES = [
     },
 ]
 
-LANGUAGE_TIERS = [
-    {"id": "starter", "name": {"en": "Starter", "zh": "Starter"}, "max_lang": 3, "add_price": 0},
-    {"id": "business", "name": {"en": "Business", "zh": "Business"}, "max_lang": 5, "add_price": 1500},
-    {"id": "pro", "name": {"en": "Pro", "zh": "Pro"}, "max_lang": 10, "add_price": 3000},
-]
-
-BANKING_SERVICE_NOTE = {
-    "en": "Banking / payment-related services are handled individually and quoted separately.",
-    "zh": "银行/收款相关服务为单独评估与单独报价。"
-}
-
-
 DASHBOARD_RECENT_LEADS = [
     {
+        "id": "ningbo-sockets",
         "site_id": "factory",
         "date": "2025-12-01",
         "company": "Ningbo Tools Co.",
         "country": "DE",
-        "project_en": "Socket & wrench set for German distributor",
-        "project_zh": "面向德国经销商的套筒扳手组套项目",
         "budget": "USD 15,000",
     },
     {
+        "id": "hangzhou-gift-tea",
         "site_id": "tea",
         "date": "2025-12-03",
         "company": "Hangzhou Leaf Story",
         "country": "US",
-        "project_en": "Premium gift tea boxes for online store",
-        "project_zh": "高端礼盒茶叶，用于跨境电商平台",
         "budget": "USD 8,000",
     },
     {
+        "id": "demo-b2c-order",
         "site_id": "shop",
         "date": "2025-12-05",
         "company": "Demo online buyer",
         "country": "UK",
-        "project_en": "Sample B2C export shop test order",
-        "project_zh": "B2C 出口商城测试订单",
         "budget": "USD 3,500",
     },
 ]
 
 
+# -------------------------
+# Uptime prober (background; the dashboard only reads its latest snapshot)
+# -------------------------
+UPTIME_PROBE_ENABLED = os.environ.get("UPTIME_PROBE_ENABLED", "1") == "1"
+
+uptime_prober = UptimeProber(
+    DASHBOARD_SITES,
+    interval=float(os.environ.get("UPTIME_PROBE_INTERVAL", "60")),
+    concurrency=int(os.environ.get("UPTIME_PROBE_CONCURRENCY", "8")),
+    timeout=float(os.environ.get("UPTIME_PROBE_TIMEOUT", "5")),
+    history=int(os.environ.get("UPTIME_PROBE_HISTORY", "120")),
+    # One prober per deployment: workers share the lock and snapshot file in this directory.
+    state_dir=os.environ.get("UPTIME_STATE_DIR", os.path.join(app.root_path, "data")),
+)
+UPTIME_UNKNOWN = summarize_uptime([])
+
+
+@app.before_request
+def ensure_uptime_prober():
+    # Started lazily (not at import), so the lock is taken after gunicorn forks; only the
+    # worker that holds it probes, the others read its snapshot file.
+    if UPTIME_PROBE_ENABLED:
+        uptime_prober.start()
+
+
 def build_dashboard_summary(lang: str) -> dict:
+    t = messages.view(lang)
     total_sites = len(DASHBOARD_SITES)
     total_leads_30d = sum(s.get("leads_30d", 0) for s in DASHBOARD_SITES)
     ai_enabled_sites = sum(1 for s in DASHBOARD_SITES if s.get("ai_rfq") or s.get("ai_chat"))
+    uptime = uptime_prober.snapshot()
 
     sites_localized = []
     for site in DASHBOARD_SITES:
         s = dict(site)
-        s["display_name"] = site["name_zh"] if lang == "zh" else site["name_en"]
+        s["display_name"] = t.pick(site.get("name"), f"dashboard.site.{site['id']}.name", site["id"])
+
+        # status / uptime_pct / latency_ms / sparkline ... ("unknown" until the first probe round)
+        s.update(uptime.get(site["id"]) or UPTIME_UNKNOWN)
 
         ai_labels = []
         if site.get("ai_rfq"):
-            ai_labels.append("AI Smart RFQ**" if lang == "en" else "AI 智能 RFQ**")
+            ai_labels.append(t.gettext("AI Smart RFQ**"))
         if site.get("ai_chat"):
-            ai_labels.append("AI Chat" if lang == "en" else "AI 在线咨询")
-        s["ai_label_str"] = ", ".join(ai_labels) if ai_labels else ("None" if lang == "en" else "暂无")
+            ai_labels.append(t.gettext("AI Chat"))
+        s["ai_label_str"] = ", ".join(ai_labels) if ai_labels else t.gettext("None")
 
         sites_localized.append(s)
 
@@ -437,7 +354,7 @@ def build_dashboard_summary(lang: str) -> dict:
         site = next((s for s in sites_localized if s["id"] == lead["site_id"]), None)
         if site:
             l["site_name"] = site["display_name"]
-        l["project"] = lead["project_zh"] if lang == "zh" else lead["project_en"]
+        l["project"] = t.pick(lead.get("project"), f"dashboard.lead.{lead['id']}.project")
         recent_leads.append(l)
 
     return {
@@ -450,142 +367,74 @@ def build_dashboard_summary(lang: str) -> dict:
 
 
 # -------------------------
-# Add-ons (Multilingual) & Support Policy (for templates)
+# Add-ons (texts: "addon.<id>.name|desc") & Support Policy ("support.<field>") for templates
 # -------------------------
 ADDONS = [
-    {
-        "id": "addon_domain",
-        "name": {"en": "Website address", "zh": "网站地址"},
-        "price": "150元 / year",
-        "desc": {
-            "en": "The price is not guaranteed and depends on the domain.",
-            "zh": "价格不保证，取决于域名。",
-        },
-    },
-    {
-        "id": "addon_seo",
-        "name": {"en": "Search Engine SEO Setup", "zh": "搜索引擎 SEO 基础设置"},
-        "price": "250元",
-        "desc": {
-            "en": "On-page SEO essentials: titles/meta, site structure, sitemap, and indexing guidance (no ranking guarantee). Also covers basic performance and crawlability checks (canonical/robots) to reduce indexing issues.",
-            "zh": "站内 SEO 基础设置：标题/描述、站点结构、站点地图与收录指引（不承诺排名）。同时包含基础性能与可抓取性检查（canonical/robots），以减少收录与索引问题。",
-        },
-    },
-    {
-        "id": "addon_copywriting",
-        "name": {"en": "Professional Language Copywriting", "zh": "专业语言文案撰写"},
-        "price": "200元",
-        "desc": {
-            "en": "Conversion-focused, polished copy for key pages (based on your materials). Includes tone and terminology alignment plus one revision round to match your brand voice.",
-            "zh": "为关键页面提供更地道、更具转化力的专业文案（基于你提供的资料）。包含语气与行业用语统一，并提供 1 轮修改以贴合您的品牌风格。",
-        },
-    },
-    {
-        "id": "addon_messaging",
-        "name": {"en": "Website Messaging + Seller Inbox Dashboard", "zh": "网站站内消息 + 商家后台收件箱"},
-        "price": "200元",
-        "desc": {
-            "en": "Visitor can send a message from the website (name + email + message). Seller can view messages and reply in a dashboard (inbox + conversation thread).",
-            "zh": "访客可在网站发送消息（姓名/邮箱/内容）。商家可在后台仪表盘查看与回复（收件箱 + 对话线程）。",
-        },
-    },
-        {
-        "id": "addon_product_manager",
-        "name": {"en": "Product Manager Dashboard", "zh": "商品管理后台"},
-        "price": "450元",
-        "desc": {
-            "en": "Seller can add, edit, hide/remove products and update prices in a secure dashboard. Product data is stored in a database and updates sync to the storefront immediately (basic catalog management; no inventory/ERP).",
-            "zh": "商家可在安全后台新增/编辑/下架商品并修改价格。商品数据存入数据库，前台展示实时同步更新（基础商品目录管理，不含库存/ERP）。",
-        },
-    },
+    {"id": "addon_domain", "price": "150元 / year"},
+    {"id": "addon_seo", "price": "250元"},
+    {"id": "addon_copywriting", "price": "200元"},
+    {"id": "addon_messaging", "price": "200元"},
+    {"id": "addon_product_manager", "price": "450元"},
 ]
 
+SUPPORT_POLICY_FIELDS = ("hours", "missed_calls", "browsing", "multi_lang", "contact_email")
+
 
 def localize_addons(lang: str):
-    lang = "zh" if (lang or "").lower().startswith("zh") else "en"
-    items = []
-    for a in ADDONS:
-        items.append(
-            {
-                "id": a["id"],
-                "display_name": a["name"][lang],
-                "price": a["price"],
-                "display_desc": a["desc"][lang],
-            }
-        )
-    return items
+    t = messages.view(lang)
+    return [{
+        "id": a["id"],
+        "display_name": t.pick(a.get("name"), f"addon.{a['id']}.name"),
+        "price": a["price"],
+        "display_desc": t.pick(a.get("desc"), f"addon.{a['id']}.desc"),
+    } for a in ADDONS]
 
-def localize_language_tiers(lang: str):
-    lang = "zh" if (lang or "").lower().startswith("zh") else "en"
-    items = []
-    for t in LANGUAGE_TIERS:
-        items.append({
-            "id": t["id"],
-            "display_name": t["name"][lang],
-            "max_lang": t["max_lang"],
-            "add_price": t["add_price"],
-        })
-    return items
 
 def localize_language_tiers(lang: str):
-    lang = "zh" if (lang or "").lower().startswith("zh") else "en"
+    t = messages.view(lang)
     return [{
-        "id": t["id"],
-        "display_name": t["name"][lang],
-        "max_lang": t["max_lang"],
-        "add_price": t["add_price"],
-    } for t in LANGUAGE_TIERS]
+        "id": tier["id"],
+        "display_name": t.pick(tier.get("name"), f"tier.{tier['id']}.name", tier["id"]),
+        "max_lang": tier["max_lang"],
+        "add_price": tier["add_price"],
+    } for tier in LANGUAGE_TIERS]
 
 
 def get_support_policy(lang: str):
-    lang = "zh" if (lang or "").lower().startswith("zh") else "en"
-    if lang == "zh":
-        return {
-            "hours": "周一-周三 09:00-12:00<br>周四-周五 09:00-18:00",
-            "missed_calls": "未接来电：1 个工作日内回拨",
-            "browsing": "支持手机端与电脑端访问",
-            "multi_lang": "Starter 3 种语言<br>Business 5 种语言<br>Pro 10 种语言",
-            "contact_email": "可选：展示公司邮箱（如 info@skylaneia.com）",
-        }
-    return {
-        "hours": "Mon–Wed 09:00–12:00; <br>Thu–Fri 09:00–18:00",
-        "missed_calls": "Missed calls: call back within 1 business day",
-        "browsing": "Mobile and PC browsing supported",
-        "multi_lang": "Starter 3; <br>Business 5; <br>Pro 10 languages",
-        "contact_email": "Optional: display your company email (e.g., info@skylaneia.com)",
-    }
+    t = messages.view(lang)
+    return {field: t.get(f"support.{field}", "") for field in SUPPORT_POLICY_FIELDS}
 
 
-def localize_projects(lang: str):
+def localize_projects(lang: str, projects=None):
+    projects = PROJECTS if projects is None else projects
+    t = messages.view(lang)
     localized = []
-    for p in PROJECTS:
+    for p in projects:
         p_copy = dict(p)
-        desc = p_copy.get("desc")
-        if isinstance(desc, dict):
-            p_copy["desc"] = desc.get(lang, desc.get("en"))
+        p_copy["desc"] = t.pick(p.get("desc"), f"project.{p['id']}.desc")
         localized.append(p_copy)
     return localized
 
 
-def localize_packages(lang: str):
-    project_map = {p["id"]: p for p in PROJECTS}
+@tracer.wrap()
+def localize_packages(lang: str, packages=None, projects=None):
+    projects = PROJECTS if projects is None else projects
+    packages = PACKAGES if packages is None else packages
+    project_map = {p["id"]: p for p in projects}
+    t = messages.view(lang)
     localized = []
 
-    for pkg in PACKAGES:
+    for pkg in packages:
         p = dict(pkg)
+        key = f"package.{pkg['id']}."
 
-        # Localize
-        def pick(d, fallback=""):
-            if isinstance(d, dict):
-                return d.get(lang, d.get("en")) or fallback
-            return d or fallback
-
-        p["display_name"] = pick(p.get("name"), "")
-        p["display_price"] = pick(p.get("price"), "")
-        p["display_delivery"] = pick(p.get("delivery"), "")
-        p["display_bullets"] = pick(p.get("bullets"), []) or []
-        p["display_excluded"] = pick(p.get("excluded"), []) or []
-        p["display_ai_options"] = pick(p.get("ai_options"), []) or []
+        # Localize (catalog texts; a tenant's own packages may carry inline values instead)
+        p["display_name"] = t.pick(p.get("name"), key + "name")
+        p["display_price"] = t.pick(p.get("price"), key + "price")
+        p["display_delivery"] = t.pick(p.get("delivery"), key + "delivery")
+        p["display_bullets"] = t.pick(p.get("bullets"), key + "bullets", ()) or ()
+        p["display_excluded"] = t.pick(p.get("excluded"), key + "excluded", ()) or ()
+        p["display_ai_options"] = t.pick(p.get("ai_options"), key + "ai_options", ()) or ()
 
         # Link to demo project
         proj = project_map.get(p.get("project_id"))
@@ -697,9 +546,10 @@ SkyLane AI Studio（天航智网工作室）专注为中国工厂和外贸公司
 }
 
 
-def build_ai_system_prompt(lang: str) -> str:
+def build_ai_system_prompt(lang: str, kb_source=None) -> str:
+    kb_source = AI_KB if kb_source is None else kb_source
     if lang == "zh":
-        kb = AI_KB["agency_zh"]
+        kb = kb_source.get("agency_zh", AI_KB["agency_zh"])
         return f"""
 你是 SkyLane AI Studio（天航智网工作室）的智能网站顾问助手。
 请用简体中文回答用户问题，并结合以下背景信息简介：
@@ -711,7 +561,7 @@ def build_ai_system_prompt(lang: str) -> str:
 - 主动引导他们提供产品类别、目标市场、预算等信息；
 - 不要谈论你是一个 AI 模型，只表现为网站顾问。
 """
-    kb = AI_KB["agency_en"]
+    kb = kb_source.get("agency_en", AI_KB["agency_en"])
     return f"""
 You are the smart website consultant for SkyLane AI Studio.
 Always answer in clear, simple English unless the user explicitly uses Chinese.
@@ -726,56 +576,404 @@ Guidelines:
 """
 
 
+# -------------------------
+# Tenants (host-based: one process serves many client sites)
+# -------------------------
+TENANTS_DIR = os.environ.get("TENANTS_DIR", os.path.join(app.root_path, "tenants"))
+TENANTS_CHECK_INTERVAL = float(os.environ.get("TENANTS_CHECK_INTERVAL", "2"))
+
+
+def clear_template_cache():
+    # Jinja keeps compiled templates and only re-checks them with auto_reload.
+    if app.jinja_env.cache is not None:
+        app.jinja_env.cache.clear()
+
+
+tenant_registry = TenantRegistry(
+    TENANTS_DIR,
+    defaults={
+        "projects": PROJECTS,
+        "packages": PACKAGES,
+        "ai_kb": AI_KB,
+        "enable_ai_chat": ENABLE_AI_CHAT,
+        "enable_smart_rfq": ENABLE_SMART_RFQ,
+        "theme": "classic",
+        "default_lang": DEFAULT_LANG,
+    },
+    check_interval=TENANTS_CHECK_INTERVAL,
+    on_templates_changed=clear_template_cache,
+)
+
+# Tenant template overrides: "tenants/<id>/templates/<name>" -> <TENANTS_DIR>/<id>/templates/<name>
+app.jinja_env.loader = ChoiceLoader([
+    app.jinja_env.loader,
+    PrefixLoader({"tenants": FileSystemLoader(TENANTS_DIR)}),
+])
+
+
+@app.before_request
+def bind_tenant():
+    g.tenant = tenant_registry.resolve(request.host)
+
+
+def get_tenant():
+    return getattr(g, "tenant", None) or tenant_registry.default
+
+
+def render_tenant_page(template: str, lang: str, is_wechat: bool):
+    tenant = get_tenant()
+    context = dict(
+        projects=tenant.view("projects", lang, lambda: localize_projects(lang, tenant.projects), "projects"),
+        support_policy=tenant.view("support_policy", lang, lambda: get_support_policy(lang)),
+        addons=tenant.view("addons", lang, lambda: localize_addons(lang)),
+        packages=tenant.view(
+            "packages", lang,
+            lambda: localize_packages(lang, tenant.packages, tenant.projects),
+            "packages", "projects",
+        ),
+        lang=lang,
+        is_wechat=is_wechat,
+        enable_ai_chat=tenant.enable_ai_chat,
+        enable_smart_rfq=tenant.enable_smart_rfq,
+    )
+    with tracer.span("render_template", template=template, tenant=tenant.id):
+        return render_template(tenant.template_names(template), **context)
+
+
+# -------------------------
+# Post-render HTML optimization (minify + critical CSS)
+# -------------------------
+HTML_OPTIMIZE_ENABLED = os.environ.get("HTML_OPTIMIZE_ENABLED", "1") == "1"
+
+html_optimizer = HtmlOptimizer(
+    app.static_url_path,
+    app.static_folder,
+    fold_bytes=int(os.environ.get("CRITICAL_CSS_FOLD_BYTES", "12000")),
+)
+
+
+@template_rendered.connect_via(app)
+def remember_page_template(sender, template, context, **extra):
+    # The first template rendered in a request is the page (includes do not emit this signal).
+    if "page_template" not in g:
+        g.page_template = template.name
+
+
+@app.after_request
+def optimize_html(response):
+    name = g.get("page_template")
+    if (
+        not HTML_OPTIMIZE_ENABLED
+        or not name
+        or response.status_code != 200
+        or response.mimetype != "text/html"
+        or response.is_streamed
+        # Fragments are optimized before caching; their ETag already covers the final bytes.
+        or response.get_etag()[0]
+    ):
+        return response
+    key = (get_tenant().id, name, g.get("lang"))
+    with tracer.span("html_optimize", template=name):
+        response.set_data(html_optimizer.optimize(response.get_data(as_text=True), key))
+    return response
+
+
+# -------------------------
+# WeChat lite page (self-contained, no third-party requests)
+# -------------------------
+# Lite is chosen by ?lite=1 / ?lite=0, otherwise automatically for WeChat's in-app browser.
+WECHAT_LITE_AUTO = os.environ.get("WECHAT_LITE_AUTO", "1") == "1"
+# Hard cap on the rendered lite page (uncompressed bytes), enforced by check_lite.py.
+WECHAT_LITE_BUDGET_BYTES = int(os.environ.get("WECHAT_LITE_BUDGET_BYTES", str(20 * 1024)))
+
+_inline_static_cache = {}  # filename -> (mtime_ns, Markup)
+
+
+@app.template_global()
+def inline_static(filename: str):
+    """Contents of a static file, for inlining into a page (CSS, SVG sprites)."""
+    path = os.path.join(app.static_folder, filename)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _inline_static_cache.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        content = Markup(f.read().strip())
+    _inline_static_cache[filename] = (mtime, content)
+    return content
+
+
+def wants_wechat_lite() -> bool:
+    """?lite= wins and is remembered in the session; otherwise the WeChat user agent decides."""
+    flag = request.args.get("lite")
+    if flag is not None:
+        session["wechat_lite"] = flag not in ("0", "false", "no", "")
+    if "wechat_lite" in session:
+        return session["wechat_lite"]
+    return WECHAT_LITE_AUTO and "micromessenger" in request.headers.get("User-Agent", "").lower()
+
+
+# -------------------------
+# Chat / RFQ archive (append-only, searched from /dashboard/archive)
+# -------------------------
+ARCHIVE_ENABLED = os.environ.get("ARCHIVE_ENABLED", "1") == "1"
+ARCHIVE_PAGE_SIZE = int(os.environ.get("ARCHIVE_PAGE_SIZE", "20"))
+
+# The archive holds buyer contact details and full transcripts: /dashboard/archive (and the
+# lead exports) ask for HTTP basic auth, and answer 404 until ARCHIVE_VIEW_PASSWORD is set.
+ARCHIVE_VIEW_USER = os.environ.get("ARCHIVE_VIEW_USER", "admin")
+ARCHIVE_VIEW_PASSWORD = os.environ.get("ARCHIVE_VIEW_PASSWORD", "")
+
+archive = Archive(
+    os.environ.get("ARCHIVE_PATH", os.path.join(app.root_path, "data", "archive.sqlite3")),
+    batch_size=int(os.environ.get("ARCHIVE_BATCH_SIZE", "200")),
+    flush_interval=float(os.environ.get("ARCHIVE_FLUSH_INTERVAL", "1")),
+    queue_size=int(os.environ.get("ARCHIVE_QUEUE_SIZE", "10000")),
+    retention_days=float(os.environ.get("ARCHIVE_RETENTION_DAYS", "365")),
+)
+atexit.register(archive.close)
+
+# Shown next to an RFQ hit in the archive view.
+ARCHIVE_RFQ_META = ("company", "buyer_name", "email", "country", "product")
+
+
+def message_text(content) -> str:
+    """Text of a chat message: a string, or the text parts of an OpenAI content-part list."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = [p.get("text") if isinstance(p, dict) else p for p in content]
+        return "\n".join(p for p in parts if isinstance(p, str) and p)
+    return ""
+
+
+def archive_result(kind: str, data: dict, payload: dict, tenant):
+    """Queue one /api/ai-chat or /api/smart-rfq result (never blocks). Shared with asgi.py."""
+    if not ARCHIVE_ENABLED:
+        return
+    lang = messages.normalize(str(data.get("lang") or ""), "en")
+    if kind == "chat":
+        user_turns = [message_text(m.get("content")) for m in data.get("messages", [])
+                      if m.get("role", "user") == "user"]
+        question = user_turns[-1] if user_turns else ""
+        answer = payload.get("reply", "")
+        meta = {"turns": len(data.get("messages", []))}
+    else:
+        question = "\n".join(
+            f"{k}: {v.strip()}" for k, v in data.items()
+            if k != "lang" and isinstance(v, str) and v.strip()
+        )
+        answer = "\n\n".join(filter(None, (payload.get("rfq_en"), payload.get("rfq_zh"))))
+        meta = {k: data[k].strip() for k in ARCHIVE_RFQ_META if isinstance(data.get(k), str) and data[k].strip()}
+    archive.record(kind, question, answer, tenant=tenant.id, lang=lang, meta=meta)
+
+
+def archive_view_authorized() -> bool:
+    auth = request.authorization
+    if auth is None or auth.type != "basic":
+        return False
+    user_ok = hmac.compare_digest((auth.username or "").encode(), ARCHIVE_VIEW_USER.encode())
+    password_ok = hmac.compare_digest((auth.password or "").encode(), ARCHIVE_VIEW_PASSWORD.encode())
+    return user_ok and password_ok
+
+
+def buyer_data_denied():
+    """None if the request may see buyer data; otherwise the response to send instead."""
+    if not ARCHIVE_VIEW_PASSWORD:
+        abort(404)
+    if not archive_view_authorized():
+        return Response("Authentication required", 401,
+                        {"WWW-Authenticate": 'Basic realm="archive", charset="UTF-8"'})
+    return None
+
+
+# -------------------------
+# Dashboard exports (CSV / XLSX, streamed row by row)
+# -------------------------
+# format -> (mimetype, writer); writers are generators of byte chunks (export.py)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", csv_stream),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", xlsx_stream),
+}
+
+# Column headers are English msgids, localized through the catalog like template texts.
+LEAD_EXPORT_HEADER = ("Date", "Site", "Company", "Country", "Project", "Budget")
+SITE_EXPORT_HEADER = ("Site", "Type", "Status", "Uptime (%)", "Latency (ms)", "HTTP status",
+                      "TLS days left", "Leads (30d)", "AI features", "URL")
+
+
+def tenant_site_ids(tenant):
+    """Dashboard sites a tenant may export: those served on its hosts. None = all (default host)."""
+    if tenant is tenant_registry.default:
+        return None
+    return {s["id"] for s in DASHBOARD_SITES if normalize_host(urlsplit(s["url"]).netloc) in tenant.hosts}
+
+
+def iter_leads(date_from: str = None, date_to: str = None, site_ids=None):
+    """
+    Leads in date order, filtered (dates are ISO "YYYY-MM-DD", bounds inclusive; site_ids None = all).
+    Keep this a generator when leads move to a real store (DB cursor / CRM paging):
+    the exports never hold more than one row.
+    """
+    for lead in DASHBOARD_RECENT_LEADS:
+        if site_ids is not None and lead["site_id"] not in site_ids:
+            continue
+        if date_from and lead["date"] < date_from:
+            continue
+        if date_to and lead["date"] > date_to:
+            continue
+        yield lead
+
+
+def lead_export_rows(lang: str, leads):
+    t = messages.view(lang)
+    site_names = {s["id"]: t.pick(s.get("name"), f"dashboard.site.{s['id']}.name", s["id"]) for s in DASHBOARD_SITES}
+    for lead in leads:
+        yield (
+            lead["date"],
+            site_names.get(lead["site_id"], lead["site_id"]),
+            lead.get("company"),
+            lead.get("country"),
+            t.pick(lead.get("project"), f"dashboard.lead.{lead['id']}.project"),
+            lead.get("budget"),
+        )
+
+
+def site_export_rows(lang: str, site_ids=None):
+    for s in build_dashboard_summary(lang)["sites"]:
+        if site_ids is not None and s["id"] not in site_ids:
+            continue
+        yield (
+            s["display_name"], s.get("type"), s["status"], s["uptime_pct"], s["latency_ms"],
+            s["status_code"], s["tls_days_left"], s.get("leads_30d"), s["ai_label_str"], s["url"],
+        )
+
+
+def parse_export_date(name: str):
+    raw = (request.args.get(name) or "").strip()
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(raw, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        abort(400, f"{name} must be YYYY-MM-DD")
+
+
 # -------------------------
 # Routes
 # -------------------------
 @app.get("/")
 def index_pc():
-    lang = get_lang(default=DEFAULT_LANG)
-    return render_template(
-        "index_pc.html",
-        projects=localize_projects(lang),
-        support_policy=get_support_policy(lang),
-        addons=localize_addons(lang),
-        packages=localize_packages(lang),
-        lang=lang,
-        is_wechat=False,
-        enable_ai_chat=ENABLE_AI_CHAT,
-        enable_smart_rfq=ENABLE_SMART_RFQ,
-    )
+    lang = get_lang(default=get_tenant().default_lang)
+    return render_tenant_page("index_pc.html", lang, is_wechat=False)
 
 
 @app.get("/wechat")
 def index_wechat():
     # Default to Chinese for WeChat, but can be switched by ?lang=en
     lang = get_lang(default="zh")
-    return render_template(
-        "index_wechat.html",
-        projects=localize_projects(lang),
-        support_policy=get_support_policy(lang),
-        addons=localize_addons(lang),
-        packages=localize_packages(lang),
-        lang=lang,
-        is_wechat=True,
-        enable_ai_chat=ENABLE_AI_CHAT,
-        enable_smart_rfq=ENABLE_SMART_RFQ,
-    )
+    template = "index_wechat_lite.html" if wants_wechat_lite() else "index_wechat.html"
+    response = app.make_response(render_tenant_page(template, lang, is_wechat=True))
+    if "lite" not in request.args and WECHAT_LITE_AUTO:
+        response.vary.add("User-Agent")
+    return response
 
 
 @app.get("/dashboard")
 def dashboard():
     lang = get_lang(default=DEFAULT_LANG)
+    tenant = get_tenant()
     summary = build_dashboard_summary(lang)
     return render_template(
-        "dashboard.html",
+        tenant.template_names("dashboard.html"),
         lang=lang,
         is_wechat=False,
-        enable_ai_chat=ENABLE_AI_CHAT,
-        enable_smart_rfq=ENABLE_SMART_RFQ,
+        enable_ai_chat=tenant.enable_ai_chat,
+        enable_smart_rfq=tenant.enable_smart_rfq,
         summary=summary,
+        exports_enabled=bool(ARCHIVE_VIEW_PASSWORD),
     )
 
 
+@app.get("/dashboard/archive")
+def dashboard_archive():
+    denied = buyer_data_denied()
+    if denied:
+        return denied
+    lang = get_lang(default=DEFAULT_LANG)
+    tenant = get_tenant()
+    query = (request.args.get("q") or "").strip()
+    kind = request.args.get("kind") if request.args.get("kind") in ("chat", "rfq") else None
+    before = request.args.get("before", type=int)
+
+    # A client site's archive shows only its own buyers; the default (agency) host sees every tenant.
+    scope = None if tenant is tenant_registry.default else tenant.id
+
+    started = time.perf_counter()
+    records, older = [], None
+    if ARCHIVE_ENABLED:
+        records, older = archive.search(query, kind=kind, tenant=scope, before=before,
+                                        limit=ARCHIVE_PAGE_SIZE)
+    took_ms = (time.perf_counter() - started) * 1000.0
+    for r in records:
+        r["when"] = datetime.fromtimestamp(r["ts"]).strftime("%Y-%m-%d %H:%M")
+
+    response = app.make_response(render_template(
+        tenant.template_names("dashboard_archive.html"),
+        lang=lang,
+        is_wechat=False,
+        enable_ai_chat=tenant.enable_ai_chat,
+        enable_smart_rfq=tenant.enable_smart_rfq,
+        archive_enabled=ARCHIVE_ENABLED,
+        query=query,
+        kind=kind,
+        records=records,
+        older=older,
+        first_page=not before,
+        took_ms=took_ms,
+    ))
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Robots-Tag"] = "noindex"
+    return response
+
+
+@app.get("/dashboard/export/<dataset>.<fmt>")
+def dashboard_export(dataset, fmt):
+    """?from=YYYY-MM-DD&to=YYYY-MM-DD (leads) and ?site=<id> (both) filter the rows."""
+    if dataset not in ("leads", "sites") or fmt not in EXPORT_FORMATS:
+        abort(404)
+    denied = buyer_data_denied()
+    if denied:
+        return denied
+    lang = get_lang(default=DEFAULT_LANG)
+    t = messages.view(lang)
+
+    # A client site's host exports only its own sites; ?site= narrows further, never widens.
+    site_ids = tenant_site_ids(get_tenant())
+    site_id = request.args.get("site") or None
+    if site_id:
+        site_ids = {site_id} if site_ids is None or site_id in site_ids else set()
+
+    if dataset == "leads":
+        header = LEAD_EXPORT_HEADER
+        rows = lead_export_rows(lang, iter_leads(parse_export_date("from"), parse_export_date("to"), site_ids))
+    else:
+        header = SITE_EXPORT_HEADER
+        rows = site_export_rows(lang, site_ids)
+    header = [t.gettext(h) for h in header]
+
+    mimetype, writer = EXPORT_FORMATS[fmt]
+    if fmt == "xlsx":
+        body = writer(header, rows, sheet_name=t.gettext("Leads" if dataset == "leads" else "Sites"))
+    else:
+        body = writer(header, rows)
+    filename = f"{dataset}-{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    response = Response(body, mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
 @app.post("/contact")
 def contact_submit():
     name = request.form.get("name") or ""
@@ -789,25 +987,73 @@ def contact_submit():
     return redirect(url_for("index_pc", lang=lang))
 
 
+# -------------------------
+# On-demand widget fragments (loaded by static/js/widget_loader.js)
+# -------------------------
+# name -> (template, tenant feature flag)
+WIDGET_FRAGMENTS = {
+    "ai-chat": ("_ai_chat_widget.html", "enable_ai_chat"),
+    "smart-rfq": ("_smart_rfq_widget.html", "enable_smart_rfq"),
+}
+FRAGMENT_MAX_AGE = int(os.environ.get("FRAGMENT_MAX_AGE", "3600"))
+
+
+@app.get("/fragments/<name>")
+def widget_fragment(name):
+    spec = WIDGET_FRAGMENTS.get(name)
+    tenant = get_tenant()
+    if not spec or not tenant.get(spec[1]):
+        abort(404)
+
+    # Language comes from the URL only (no session), so the response is cacheable per URL.
+    lang = messages.normalize((request.args.get("lang") or "").strip(), messages.source_lang)
+    g.lang = lang
+
+    template, _ = spec
+
+    def build():
+        html = render_template(
+            tenant.template_names(template),
+            lang=lang,
+            enable_ai_chat=tenant.enable_ai_chat,
+            enable_smart_rfq=tenant.enable_smart_rfq,
+            ENABLE_SMART_RFQ=tenant.enable_smart_rfq,
+        )
+        # Minify here rather than in optimize_html: a cache hit renders nothing, and the
+        # ETag below must hash the bytes that are actually sent.
+        if HTML_OPTIMIZE_ENABLED:
+            with tracer.span("html_optimize", template=template):
+                html = html_optimizer.optimize(html, (tenant.id, template, lang))
+        return html
+
+    html = tenant.view(f"fragment:{name}", lang, build, "templates", "enable_ai_chat", "enable_smart_rfq")
+
+    response = Response(html, mimetype="text/html")
+    response.cache_control.public = True
+    response.cache_control.max_age = FRAGMENT_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(request)
+
+
 # -------------------------
 # Legal / compliance pages
 # -------------------------
 @app.get("/privacy")
 def privacy():
     lang = get_lang(default=DEFAULT_LANG)
-    return render_template("privacy.html", lang=lang, is_wechat=False)
+    return render_template(get_tenant().template_names("privacy.html"), lang=lang, is_wechat=False)
 
 
 @app.get("/terms")
 def terms():
     lang = get_lang(default=DEFAULT_LANG)
-    return render_template("terms.html", lang=lang, is_wechat=False)
+    return render_template(get_tenant().template_names("terms.html"), lang=lang, is_wechat=False)
 
 
 @app.get("/cookies")
 def cookies():
     lang = get_lang(default=DEFAULT_LANG)
-    return render_template("cookies.html", lang=lang, is_wechat=False)
+    return render_template(get_tenant().template_names("cookies.html"), lang=lang, is_wechat=False)
 
 
 # -------------------------
@@ -831,7 +1077,7 @@ def sitemap_xml():
     urls = []
 
     for endpoint in pages:
-        for lng in ("zh", "en"):
+        for lng in messages.languages:
             loc = url_for(endpoint, _external=True, lang=lng)
             urls.append((loc, datetime.utcnow().date().isoformat()))
 
@@ -854,15 +1100,18 @@ def health():
 # -------------------------
 # APIs
 # -------------------------
-@app.post("/api/smart-rfq")
-def api_smart_rfq():
-    if not ENABLE_SMART_RFQ:
-        return jsonify({"error": "Smart RFQ is disabled"}), 403
+def prepare_smart_rfq(data: dict, tenant):
+    """
+    Validate a /api/smart-rfq payload.
+    Returns (create_kwargs, None) or (None, (error_payload, status)).
+    Shared by the Flask route and the async fast path in asgi.py.
+    """
+    if not tenant.enable_smart_rfq:
+        return None, ({"error": "Smart RFQ is disabled"}, 403)
 
     if os.environ.get("OPENAI_API_KEY") is None:
-        return jsonify({"error": "OPENAI_API_KEY is not set on the server"}), 500
+        return None, ({"error": "OPENAI_API_KEY is not set on the server"}, 500)
 
-    data = request.get_json(silent=True) or {}
     lang = data.get("lang", "en")
     lang = "zh" if (lang and str(lang).lower() in ("zh", "cn", "zh-cn", "zh-hans")) else "en"
 
@@ -880,46 +1129,56 @@ def api_smart_rfq():
         {"role": "user", "content": user_prompt},
     ]
 
-    try:
-        completion = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=messages,
-            max_tokens=900,
-            temperature=0.4,
-        )
-        raw = (completion.choices[0].message.content or "").strip()
+    return {
+        "model": "gpt-4.1-mini",
+        "messages": messages,
+        "max_tokens": 900,
+        "temperature": 0.4,
+    }, None
+
+
+def llm_span(params: dict):
+    """Span around one chat.completions.create round trip (sync or async client)."""
+    return tracer.span(
+        "openai.chat.completions.create", kind=SPAN_KIND_CLIENT,
+        **{"gen_ai.system": "openai", "gen_ai.request.model": params["model"],
+           "gen_ai.request.max_tokens": params["max_tokens"]},
+    )
 
-        try:
-            parsed = json.loads(raw)
-            rfq_en = (parsed.get("rfq_en") or "").strip()
-            rfq_zh = (parsed.get("rfq_zh") or "").strip()
-        except Exception:
-            rfq_en = raw
-            rfq_zh = "（AI 输出未按 JSON 格式返回，以下为英文原文，请人工翻译或重新生成。）\n\n" + rfq_en
 
-        return jsonify({"rfq_en": rfq_en, "rfq_zh": rfq_zh})
+def parse_smart_rfq(completion) -> dict:
+    raw = (completion.choices[0].message.content or "").strip()
 
-    except Exception as e:
-        return jsonify({"error": "Smart RFQ generation failed", "detail": str(e)}), 500
+    try:
+        parsed = json.loads(raw)
+        rfq_en = (parsed.get("rfq_en") or "").strip()
+        rfq_zh = (parsed.get("rfq_zh") or "").strip()
+    except Exception:
+        rfq_en = raw
+        rfq_zh = "（AI 输出未按 JSON 格式返回，以下为英文原文，请人工翻译或重新生成。）\n\n" + rfq_en
 
+    return {"rfq_en": rfq_en, "rfq_zh": rfq_zh}
 
-@app.post("/api/ai-chat")
-def api_ai_chat():
-    if not ENABLE_AI_CHAT:
-        return jsonify({"error": "AI chat is disabled"}), 403
+
+def prepare_ai_chat(data: dict, tenant):
+    """
+    Validate a /api/ai-chat payload.
+    Returns (create_kwargs, None) or (None, (error_payload, status)).
+    """
+    if not tenant.enable_ai_chat:
+        return None, ({"error": "AI chat is disabled"}, 403)
 
     if os.environ.get("OPENAI_API_KEY") is None:
-        return jsonify({"error": "OPENAI_API_KEY is not set on the server"}), 500
+        return None, ({"error": "OPENAI_API_KEY is not set on the server"}, 500)
 
-    data = request.get_json(silent=True) or {}
     user_messages = data.get("messages", [])
     lang = data.get("lang", "en")
     lang = "zh" if str(lang).lower() in ("zh", "cn", "zh-cn", "zh-hans") else "en"
 
     if not user_messages:
-        return jsonify({"error": "No messages provided"}), 400
+        return None, ({"error": "No messages provided"}, 400)
 
-    system_prompt = build_ai_system_prompt(lang)
+    system_prompt = build_ai_system_prompt(lang, tenant.ai_kb)
 
     messages = [{"role": "system", "content": system_prompt}]
     for m in user_messages:
@@ -928,17 +1187,52 @@ def api_ai_chat():
         if content:
             messages.append({"role": role, "content": content})
 
+    return {
+        "model": "gpt-4.1-mini",
+        "messages": messages,
+        "max_tokens": 450,
+        "temperature": 0.4,
+    }, None
+
+
+def parse_ai_chat(completion) -> dict:
+    return {"reply": completion.choices[0].message.content or ""}
+
+
+@app.post("/api/smart-rfq")
+def api_smart_rfq():
+    data = request.get_json(silent=True) or {}
+    params, err = prepare_smart_rfq(data, get_tenant())
+    if err:
+        return jsonify(err[0]), err[1]
+
     try:
-        completion = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=messages,
-            max_tokens=450,
-            temperature=0.4,
-        )
-        reply = completion.choices[0].message.content or ""
-        return jsonify({"reply": reply})
+        with llm_span(params):
+            completion = client.chat.completions.create(**params)
+        payload = parse_smart_rfq(completion)
+    except Exception as e:
+        app.logger.warning("Smart RFQ generation failed: %s", e)
+        return jsonify({"error": "Smart RFQ generation failed", "detail": str(e)}), 500
+    archive_result("rfq", data, payload, get_tenant())
+    return jsonify(payload)
+
+
+@app.post("/api/ai-chat")
+def api_ai_chat():
+    data = request.get_json(silent=True) or {}
+    params, err = prepare_ai_chat(data, get_tenant())
+    if err:
+        return jsonify(err[0]), err[1]
+
+    try:
+        with llm_span(params):
+            completion = client.chat.completions.create(**params)
+        payload = parse_ai_chat(completion)
     except Exception as e:
+        app.logger.warning("AI chat request failed: %s", e)
         return jsonify({"error": "AI chat request failed", "detail": str(e)}), 500
+    archive_result("chat", data, payload, get_tenant())
+    return jsonify(payload)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,370 @@
+"""
+archive.py
+Append-only archive of AI chat replies and Smart RFQ results, searchable from the dashboard.
+
+- Requests only enqueue a record (never touch SQLite); a background thread (batching.BatchWriter)
+  writes them in batches, one transaction per batch.
+- Full-text index: SQLite FTS5 with the trigram tokenizer, i.e. case-insensitive substring
+  matching on character 3-grams. Works the same for English and Chinese (no word segmentation).
+- Terms shorter than 3 characters (茶叶, 报价, EU) can't use trigrams; they go to a second,
+  contentless FTS5 index (unicode61) over cjk_grams() of the text: every CJK run split into
+  overlapping bigrams plus its last character, other text as words. A 1-2 character CJK term
+  is then a token (or token prefix) lookup; a short Latin term matches the start of a word.
+  Both indexes cover every record, so no search falls back to scanning the table.
+- Results are paged by id ("older than #N"), so every page costs the same as the first.
+- A query mixing both kinds of term (or limited to a tenant) walks the indexes newest first in
+  rowid windows that grow 8x per round, and stops once a page is full: the short terms' matches
+  are collected one window at a time, so a page of common terms costs one small window. A
+  rare combination ends up reading each index about once.
+- Searches can be limited to one tenant; records_tenant (tenant, id) serves the listing and
+  lets a term search skip the stretches where that tenant has no records.
+- Retention: expired records are deleted from the old end of the table, a small batch per
+  writer round. Ids grow with time, so pruning walks the primary key instead of scanning.
+
+Needs SQLite >= 3.34 (trigram tokenizer). Several worker processes may share one file (WAL mode).
+Every connection that writes must come from connect(), which registers cjk_grams() for the triggers.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from markupsafe import Markup, escape
+
+from batching import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_CHARS = 180
+SCHEMA_VERSION = 2  # 1: records_grams exists and is filled; 2: records_tenant index
+SEARCH_WINDOW = 4096  # rowids in the first search window
+
+# Han, kana, hangul: scripts written without spaces between words.
+_CJK_RUN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+_WORD = re.compile(r"\w")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    meta TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    question, answer, content='records', content_rowid='id', tokenize='trigram'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS records_grams USING fts5(
+    grams, content='', detail='none', columnsize=0, tokenize='unicode61', prefix='1 2'
+);
+"""
+
+# Keep both indexes in step with `records`; (re)created by _migrate().
+TRIGGERS = (
+    """CREATE TRIGGER records_ai AFTER INSERT ON records BEGIN
+    INSERT INTO records_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    INSERT INTO records_grams(rowid, grams) VALUES (new.id, cjk_grams(new.question, new.answer));
+END""",
+    """CREATE TRIGGER records_ad AFTER DELETE ON records BEGIN
+    INSERT INTO records_fts(records_fts, rowid, question, answer)
+    VALUES ('delete', old.id, old.question, old.answer);
+    INSERT INTO records_grams(records_grams, rowid, grams)
+    VALUES ('delete', old.id, cjk_grams(old.question, old.answer));
+END""",
+)
+
+NEWEST_MATCH = "SELECT rowid FROM {table} WHERE {table} MATCH ? AND rowid <= ? ORDER BY rowid DESC LIMIT 1"
+
+COLUMNS = "r.id, r.ts, r.kind, r.tenant, r.lang, r.question, r.answer, r.meta"
+
+
+def cjk_grams(*texts, query: bool = False) -> str:
+    """
+    Text for records_grams: CJK runs become overlapping bigrams plus the run's last character
+    (so every character starts a token), everything else is left to the word tokenizer.
+    For a query term the trailing character is only kept when it is the whole run.
+    """
+    def split(m):
+        run = m.group(0)
+        grams = [run[i:i + 2] for i in range(len(run) - 1)]
+        if not query or len(run) == 1:
+            grams.append(run[-1])
+        return " " + " ".join(grams) + " "
+    return _CJK_RUN.sub(split, "\n".join(t or "" for t in texts))
+
+
+def connect(path: str, migrate: bool = True) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+    conn.create_function("cjk_grams", 2, cjk_grams, deterministic=True)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    if migrate and conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        _migrate(conn)
+    return conn
+
+
+def _migrate(conn: sqlite3.Connection):
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # Archives from before the bigram index: fill it once (about 20 s per million records).
+            conn.execute("INSERT INTO records_grams(rowid, grams) "
+                         "SELECT id, cjk_grams(question, answer) FROM records")
+        conn.execute("CREATE INDEX IF NOT EXISTS records_tenant ON records(tenant, id)")
+        conn.execute("DROP TRIGGER IF EXISTS records_ai")
+        conn.execute("DROP TRIGGER IF EXISTS records_ad")
+        for sql in TRIGGERS:
+            conn.execute(sql)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+
+def fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def gram_query(term: str) -> str:
+    """records_grams MATCH expression for a term shorter than 3 characters."""
+    tokens = [t for t in cjk_grams(term, query=True).split() if _WORD.search(t)]
+    return " AND ".join(fts_phrase(t) + " *" for t in tokens)
+
+
+def gram_query_all(terms) -> str:
+    return " AND ".join(gram_query(t) for t in terms)
+
+
+def highlight(text: str, terms, width: int = SNIPPET_CHARS) -> Markup:
+    """Escaped excerpt of `text` around the first hit, with every term wrapped in <mark>."""
+    text = " ".join((text or "").split())
+    if not terms:
+        return escape(text[:width] + ("…" if len(text) > width else ""))
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.I)
+    first = pattern.search(text)
+    start = max(0, first.start() - width // 3) if first else 0
+    end = start + width
+    excerpt = text[start:end]
+
+    out = [Markup("…")] if start else []
+    pos = 0
+    for m in pattern.finditer(excerpt):
+        out.append(escape(excerpt[pos:m.start()]))
+        out.append(Markup("<mark>%s</mark>") % m.group(0))
+        pos = m.end()
+    out.append(escape(excerpt[pos:]))
+    if end < len(text):
+        out.append(Markup("…"))
+    return Markup("").join(out)
+
+
+class Archive(BatchWriter):
+    thread_name = "archive-writer"
+
+    def __init__(self, path: str, batch_size: int = 200, flush_interval: float = 1.0,
+                 queue_size: int = 10000, retention_days: float = 365, prune_batch: int = 500,
+                 prune_interval: float = 60.0):
+        """
+        retention_days: 0 keeps everything.
+        queue_size: records waiting for the writer; beyond that new records are dropped (and counted).
+        """
+        super().__init__(batch_size, flush_interval, queue_size)
+        self.path = path
+        self.retention = retention_days * 86400
+        self.prune_batch = prune_batch
+        self.prune_interval = prune_interval
+        self._conn = None
+        self._next_prune = 0.0
+        self._local = threading.local()
+        self.stats["pruned"] = 0
+
+    # -------------------------
+    # Write side (request threads only enqueue)
+    # -------------------------
+    def record(self, kind: str, question: str, answer: str, tenant: str = "", lang: str = "",
+               meta: dict = None) -> bool:
+        """Queue one record. Never blocks; returns False if the queue is full."""
+        return self.put((time.time(), kind, tenant, lang,
+                         "" if question is None else str(question), "" if answer is None else str(answer),
+                         json.dumps(meta, ensure_ascii=False) if meta else None))
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = connect(self.path)
+        self._next_prune = 0.0
+
+    def _close(self):
+        self._conn.close()
+
+    def _insert(self, rows):
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO records (ts, kind, tenant, lang, question, answer, meta) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def _write(self, batch):
+        try:
+            self._insert(batch)
+            self.stats["written"] += len(batch)
+            return
+        except sqlite3.Error as e:
+            if len(batch) == 1:
+                self.stats["failed"] += 1
+                logger.warning("write of 1 record failed: %s", e)
+                return
+            logger.warning("write of %d record(s) failed, retrying one by one: %s", len(batch), e)
+        # One bad record must not take the rest of its batch down with it.
+        for row in batch:
+            try:
+                self._insert([row])
+                self.stats["written"] += 1
+            except sqlite3.Error as e:
+                self.stats["failed"] += 1
+                logger.warning("write of 1 record failed: %s", e)
+
+    def prune(self, conn, now: float = None) -> int:
+        """Deletes up to prune_batch expired records, oldest first. Returns how many."""
+        if not self.retention:
+            return 0
+        cutoff = (now or time.time()) - self.retention
+        with conn:
+            conn.execute("BEGIN")
+            cur = conn.execute(
+                "DELETE FROM records WHERE id IN "
+                "(SELECT id FROM records ORDER BY id LIMIT ?) AND ts < ?",
+                (self.prune_batch, cutoff),
+            )
+        self.stats["pruned"] += cur.rowcount
+        return cur.rowcount
+
+    def _idle(self):
+        if time.monotonic() < self._next_prune:
+            return
+        try:
+            # A full batch means there is probably more: keep going next round.
+            full = self.prune(self._conn) >= self.prune_batch
+        except sqlite3.Error as e:
+            logger.warning("prune failed: %s", e)
+            full = False
+        self._next_prune = 0.0 if full else time.monotonic() + self.prune_interval
+
+    # -------------------------
+    # Read side (dashboard)
+    # -------------------------
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Migrations are left to the writer thread, off the request path.
+            conn = self._local.conn = connect(self.path, migrate=False)
+            conn.execute("PRAGMA query_only=1")
+            self.start()
+            self._local.pid = os.getpid()
+        return conn
+
+    def search(self, query: str = "", kind: str = None, tenant: str = None, before: int = None,
+               limit: int = 20):
+        """
+        Newest first. Returns (records, older) where `older` is the `before` value for the
+        next page, or None on the last page. Every term must match (question or answer).
+        tenant: only that tenant's records (None: all tenants).
+        """
+        # Terms without a letter or digit (a lone "-") can't be indexed and are ignored.
+        terms = [t for t in query.split() if _WORD.search(t)]
+        indexed = [t for t in terms if len(t) >= 3]
+        short = [t for t in terms if len(t) < 3]
+
+        where, args = [], []
+        if indexed:
+            sql = f"SELECT {COLUMNS} FROM records_fts f JOIN records r ON r.id = f.rowid"
+            where.append("records_fts MATCH ?")
+            args.append(" AND ".join(fts_phrase(t) for t in indexed))
+            order = "f.rowid"
+        elif short:
+            sql = f"SELECT {COLUMNS} FROM records_grams g JOIN records r ON r.id = g.rowid"
+            where.append("records_grams MATCH ?")
+            args.append(gram_query_all(short))
+            order = "g.rowid"
+        else:
+            sql = f"SELECT {COLUMNS} FROM records r"
+            order = "r.id"
+        if kind:
+            where.append("r.kind = ?")
+            args.append(kind)
+        if tenant is not None:
+            where.append("r.tenant = ?")
+            args.append(tenant)
+
+        conn = self._reader()
+        if terms and (tenant is not None or (indexed and short)):
+            # Each side seeks its newest match at or below a rowid; see _search_windows.
+            seeks = []
+            if indexed:
+                seeks.append((NEWEST_MATCH.format(table="records_fts"), args[0]))
+            if short:
+                seeks.append((NEWEST_MATCH.format(table="records_grams"), gram_query_all(short)))
+            if tenant is not None:
+                seeks.append(("SELECT max(id) FROM records WHERE tenant = ? AND id <= ?", tenant))
+            grams = gram_query_all(short) if indexed and short else None
+            rows = self._search_windows(conn, sql, order, where, args, grams, seeks, before, limit + 1)
+        else:
+            if before:
+                where.append(f"{order} < ?")
+                args.append(before)
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            rows = conn.execute(sql + f" ORDER BY {order} DESC LIMIT ?", args + [limit + 1]).fetchall()
+
+        records = []
+        for id_, ts, kind_, tenant_, lang, question, answer, meta in rows[:limit]:
+            records.append({
+                "id": id_,
+                "ts": ts,
+                "kind": kind_,
+                "tenant": tenant_,
+                "lang": lang,
+                "question": question,
+                "answer": answer,
+                "meta": json.loads(meta) if meta else {},
+                "question_html": highlight(question, terms),
+                "answer_html": highlight(answer, terms),
+            })
+        older = records[-1]["id"] if len(rows) > limit else None
+        return records, older
+
+    @staticmethod
+    def _search_windows(conn, sql, order, where, args, grams, seeks, before, wanted):
+        """
+        Up to `wanted` rows, newest first, one rowid window at a time (for terms mixed with short
+        terms, or limited to a tenant). Short terms next to trigram terms are only matched inside
+        the window, never for the whole archive. After a window that did not fill the page, every
+        side (index or tenant) seeks its newest match below it and the search resumes at the
+        lowest of those, so a side with nothing left ends the search at once.
+        """
+        top = (before - 1) if before else conn.execute("SELECT max(id) FROM records").fetchone()[0]
+        sql += " WHERE " + " AND ".join(where + [f"{order} BETWEEN ? AND ?"])
+        if grams:
+            sql += (" AND r.id IN (SELECT rowid FROM records_grams"
+                    " WHERE records_grams MATCH ? AND rowid BETWEEN ? AND ?)")
+        sql += f" ORDER BY {order} DESC LIMIT ?"
+
+        rows = []
+        window = SEARCH_WINDOW
+        while top and top >= 1 and len(rows) < wanted:
+            lo = max(1, top - window + 1)
+            window_args = args + [lo, top] + ([grams, lo, top] if grams else [])
+            rows += conn.execute(sql, window_args + [wanted - len(rows)]).fetchall()
+            top = lo - 1
+            window *= 8
+            if len(rows) < wanted and top >= 1:
+                newest = [(conn.execute(seek, (arg, top)).fetchone() or (None,))[0] for seek, arg in seeks]
+                top = None if None in newest else min(newest)
+        return rows
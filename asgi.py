@@ -0,0 +1,178 @@
+"""
+asgi.py
+Async serving mode.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker -w 2
+
+- /api/ai-chat and /api/smart-rfq run on the event loop with the async OpenAI client,
+  so an in-flight LLM call costs one coroutine instead of one worker.
+- Every other path is handed to the unchanged Flask app (app.py) on a thread pool.
+- Validation, prompts, response shaping, archiving and tracing are shared with the WSGI routes
+  (prepare_* / parse_* / archive_result / llm_span in app.py), so both modes answer identically.
+
+The sync deployment (gunicorn app:app) keeps working as before.
+"""
+
+import asyncio
+import json
+import os
+
+from a2wsgi import WSGIMiddleware
+from openai import AsyncOpenAI
+from werkzeug.http import parse_options_header
+
+from app import (
+    app as flask_app,
+    archive_result,
+    llm_span,
+    tenant_registry,
+    tracer,
+    TRACE_ENABLED,
+    prepare_ai_chat,
+    parse_ai_chat,
+    prepare_smart_rfq,
+    parse_smart_rfq,
+)
+
+WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "16"))
+MAX_BODY_BYTES = int(os.environ.get("ASGI_MAX_BODY_BYTES", str(1024 * 1024)))
+
+async_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+wsgi_app = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+
+# path -> (prepare, parse, error label, archive kind) — mirrors the Flask routes in app.py
+ASYNC_ROUTES = {
+    "/api/ai-chat": (prepare_ai_chat, parse_ai_chat, "AI chat request failed", "chat"),
+    "/api/smart-rfq": (prepare_smart_rfq, parse_smart_rfq, "Smart RFQ generation failed", "rfq"),
+}
+
+
+def _header(scope, name: bytes) -> str:
+    for k, v in scope.get("headers") or ():
+        if k == name:
+            return v.decode("latin-1")
+    return ""
+
+
+def _host(scope) -> str:
+    # Same trust model as ProxyFix(x_host=1) in app.py: the nearest proxy's X-Forwarded-Host wins.
+    forwarded = _header(scope, b"x-forwarded-host")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()
+    return _header(scope, b"host")
+
+
+async def _send_json(send, payload: dict, status: int = 200):
+    # What jsonify() builds (same provider, separators and trailing newline), so both modes
+    # produce byte-identical bodies.
+    response = flask_app.json.response(payload)
+    body = response.get_data()
+    headers = [
+        (b"content-type", response.content_type.encode("latin-1")),
+        (b"content-length", str(len(body)).encode("ascii")),
+    ]
+    trace = tracer.current()
+    if trace is not None:
+        headers.append((b"x-trace-id", trace.trace_id.encode("ascii")))
+        trace.root.set_attribute("http.response.status_code", status)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers,
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _is_json(scope) -> bool:
+    # Same test as request.get_json(silent=True) in the Flask routes: other bodies are ignored.
+    mimetype = parse_options_header(_header(scope, b"content-type"))[0].lower()
+    return mimetype == "application/json" or (mimetype.startswith("application/") and mimetype.endswith("+json"))
+
+
+async def _read_json(scope, receive):
+    """Read the request body; returns (data, too_large). Bodies that are not JSON give {}."""
+    chunks = []
+    size = 0
+    more = True
+    while more:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return {}, False
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return {}, True
+        chunks.append(chunk)
+        more = message.get("more_body", False)
+    if not _is_json(scope):
+        return {}, False
+    try:
+        data = json.loads(b"".join(chunks) or b"{}")
+    except ValueError:
+        data = {}
+    return (data if isinstance(data, dict) else {}), False
+
+
+async def _handle_llm(scope, receive, send, route):
+    if not TRACE_ENABLED:
+        return await _serve_llm(scope, receive, send, route)
+    # Same root span as TracingMiddleware gives the WSGI routes.
+    trace = tracer.begin(
+        f"POST {scope['path']}", _header(scope, b"traceparent"),
+        **{"http.request.method": "POST", "url.path": scope["path"], "http.route": scope["path"]},
+    )
+    try:
+        await _serve_llm(scope, receive, send, route)
+    except BaseException as e:
+        tracer.finish(trace, e)
+        raise
+    tracer.finish(trace)
+
+
+async def _serve_llm(scope, receive, send, route):
+    prepare, parse, error_label, kind = route
+    data, too_large = await _read_json(scope, receive)
+    if too_large:
+        return await _send_json(send, {"error": "Request body too large"}, 413)
+
+    # Re-reading tenant files means scandir and JSON parsing: keep it off the event loop.
+    if tenant_registry.reload_due():
+        await asyncio.get_running_loop().run_in_executor(None, tenant_registry.reload)
+    tenant = tenant_registry.lookup(_host(scope))
+    params, err = prepare(data, tenant)
+    if err:
+        return await _send_json(send, err[0], err[1])
+
+    try:
+        with llm_span(params):
+            completion = await async_client.chat.completions.create(**params)
+        payload = parse(completion)
+    except Exception as e:
+        flask_app.logger.warning("%s: %s", error_label, e)
+        return await _send_json(send, {"error": error_label, "detail": str(e)}, 500)
+    archive_result(kind, data, payload, tenant)  # only enqueues, safe on the event loop
+    await _send_json(send, payload)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await async_client.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+
+    if scope["type"] == "http" and scope["method"] == "POST":
+        route = ASYNC_ROUTES.get(scope["path"])
+        if route:
+            return await _handle_llm(scope, receive, send, route)
+
+    await wsgi_app(scope, receive, send)
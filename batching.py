@@ -0,0 +1,110 @@
+"""
+batching.py
+Background batch writer shared by the archive (archive.py) and the span exporter (tracing.py).
+
+- Request threads only put() into a bounded queue: never blocks, a full queue drops the item
+  (counted in stats["dropped"]).
+- One writer thread per process takes up to batch_size units, waiting at most flush_interval
+  for a batch to fill, and hands them to _write(). close() drains the queue and stops it.
+
+Subclasses implement _write(batch) and may override _size(item) (units an item counts for),
+_open() / _close() (around the thread's life, e.g. a connection) and _idle() (after every round).
+"""
+
+import os
+import queue
+import threading
+import time
+
+
+class BatchWriter:
+    thread_name = "batch-writer"
+
+    def __init__(self, batch_size: int, flush_interval: float, queue_size: int):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.stats = {"written": 0, "dropped": 0, "failed": 0}
+
+    def put(self, item) -> bool:
+        """Queue one item. Never blocks; returns False if the queue is full."""
+        self.start()
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+
+    def start(self):
+        # Per process: a forked worker inherits the object but not the thread.
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def close(self, timeout: float = 5.0):
+        """Write what is still queued and stop the writer (registered with atexit by the app)."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._stop.set()
+            self._thread.join(timeout)
+
+    # -------------------------
+    # Hooks
+    # -------------------------
+    def _size(self, item) -> int:
+        return 1
+
+    def _open(self):
+        pass
+
+    def _close(self):
+        pass
+
+    def _write(self, batch):
+        raise NotImplementedError
+
+    def _idle(self):
+        pass
+
+    # -------------------------
+    # Writer thread
+    # -------------------------
+    def _take_batch(self):
+        try:
+            item = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch, units = [item], self._size(item)
+        deadline = time.monotonic() + self.flush_interval
+        while units < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            units += self._size(item)
+        return batch
+
+    def _run(self):
+        self._open()
+        try:
+            while not (self._stop.is_set() and self._queue.empty()):
+                batch = self._take_batch()
+                if batch:
+                    self._write(batch)
+                self._idle()
+        finally:
+            self._close()
@@ -0,0 +1,72 @@
+"""
+check_archive.py
+Check that archiving never loses good records (no network, temporary archive file):
+
+- a chat whose messages use OpenAI content parts (a list, not a string) is archived with
+  the text of those parts;
+- a record SQLite can't store fails on its own: the rest of its batch is still written.
+
+    python check_archive.py            # exits 1 and lists failures
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "check-archive")  # the OpenAI client is created at import
+os.environ.setdefault("UPTIME_PROBE_ENABLED", "0")
+os.environ["ARCHIVE_ENABLED"] = "1"
+
+from app import archive_result, tenant_registry  # noqa: E402
+import app as site  # noqa: E402
+from archive import Archive  # noqa: E402
+
+
+def main() -> int:
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "archive.sqlite3")
+        # All five records below land in one batch.
+        site.archive = Archive(path, batch_size=5, flush_interval=0.5, retention_days=0)
+
+        chats = [
+            [{"role": "user", "content": "socket sets for the EU"}],
+            [{"role": "user", "content": [{"type": "text", "text": "gift tea boxes"},
+                                          {"type": "image_url", "image_url": {"url": "https://x/y.png"}},
+                                          {"type": "text", "text": "with logo"}]}],
+            [{"role": "user", "content": {"unexpected": "shape"}}],
+        ]
+        for messages in chats:
+            archive_result("chat", {"messages": messages, "lang": "en"}, {"reply": "ok"}, tenant_registry.default)
+        # Bypasses record()'s coercion: this row can't be bound, the others in its batch can.
+        site.archive.put((0.0, "chat", "default", "en", ["not", "text"], "bad", None))
+        site.archive.record("chat", "after the bad one", "ok")
+        # Let the writer take the batch (close() would drain the queue one record at a time).
+        deadline = time.monotonic() + 5.0
+        while site.archive.stats["written"] + site.archive.stats["failed"] < 5 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        site.archive.close()
+
+        stats = dict(site.archive.stats)
+        if stats["written"] != 4 or stats["failed"] != 1:
+            problems.append(f"writer stats {stats}, expected 4 written and 1 failed")
+
+        reader = Archive(path, retention_days=0)
+        questions = [r["question"] for r in reader.search(limit=10)[0]]
+        reader.close()
+        for expected in ("socket sets for the EU", "gift tea boxes\nwith logo", "", "after the bad one"):
+            if expected not in questions:
+                problems.append(f"question {expected!r} missing from the archive (got {questions})")
+
+    for p in problems:
+        print(p)
+    if problems:
+        print(f"{len(problems)} archive problem(s)")
+        return 1
+    print("archive writes OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+check_cache.py
+Build-time check for compression and revalidation, for every encoding the server offers:
+
+- text responses (pages, fragments, CSS, JS) come back compressed;
+- revalidating with the ETag we sent (If-None-Match) gets a 304 with that same ETag;
+- an ETag from another encoding does not match;
+- uncompressed, the first (uncached) and a repeated request get the same body, and
+  its ETag is that body's hash.
+
+    python check_cache.py            # exits 1 and lists failures
+"""
+
+import hashlib
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "check-cache")  # the OpenAI client is created at import
+os.environ.setdefault("UPTIME_PROBE_ENABLED", "0")
+
+from app import app  # noqa: E402
+from compression import brotli  # noqa: E402
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# (path, expects an ETag)
+PATHS = (
+    ("/fragments/ai-chat?lang=en", True),
+    ("/fragments/smart-rfq?lang=zh", True),
+    ("/static/css/site.css", True),
+    ("/static/js/bgfx_core.js", True),
+    ("/static/js/widget_loader.js", True),
+    ("/?lang=en", False),
+)
+
+
+def check_path(client, path: str, wants_etag: bool):
+    problems = []
+    etags = {}
+    if wants_etag:
+        first = client.get(path, headers={"Accept-Encoding": "identity"})
+        second = client.get(path, headers={"Accept-Encoding": "identity"})
+        if first.data != second.data:
+            problems.append(f"{path} [identity]: body changed between requests "
+                            f"({len(first.data)} -> {len(second.data)} bytes)")
+        expected = f'"{hashlib.sha1(second.data).hexdigest()}"'
+        if path.startswith("/fragments/") and second.headers.get("ETag") != expected:
+            problems.append(f"{path} [identity]: ETag {second.headers.get('ETag')} does not hash the body")
+
+    for encoding in ENCODINGS:
+        label = f"{path} [{encoding}]"
+        resp = client.get(path, headers={"Accept-Encoding": encoding})
+        if resp.status_code != 200:
+            problems.append(f"{label}: HTTP {resp.status_code}")
+            continue
+        if resp.headers.get("Content-Encoding") != encoding:
+            problems.append(f"{label}: not compressed ({resp.headers.get('Content-Type')})")
+        etag = resp.headers.get("ETag")
+        if not wants_etag:
+            continue
+        if not etag:
+            problems.append(f"{label}: no ETag")
+            continue
+        etags[encoding] = etag
+
+        again = client.get(path, headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+        if again.status_code != 304:
+            problems.append(f"{label}: revalidation got HTTP {again.status_code}, expected 304")
+        elif again.headers.get("ETag") != etag:
+            problems.append(f"{label}: 304 carries ETag {again.headers.get('ETag')}, expected {etag}")
+
+    for encoding, etag in etags.items():
+        for other in ENCODINGS:
+            if other == encoding:
+                continue
+            resp = client.get(path, headers={"Accept-Encoding": other, "If-None-Match": etag})
+            if resp.status_code != 200:
+                problems.append(f"{path} [{other}]: {encoding} ETag matched (HTTP {resp.status_code})")
+    return problems
+
+
+def main() -> int:
+    client = app.test_client()
+    problems = []
+    for path, wants_etag in PATHS:
+        problems.extend(check_path(client, path, wants_etag))
+
+    for p in problems:
+        print(p)
+    if problems:
+        print(f"{len(problems)} caching problem(s)")
+        return 1
+    print(f"compression and revalidation OK ({', '.join(ENCODINGS)})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
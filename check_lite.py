@@ -0,0 +1,81 @@
+"""
+check_lite.py
+Build-time check for the WeChat lite page (/wechat?lite=1), for every language and tenant:
+
+- rendered size stays under WECHAT_LITE_BUDGET_BYTES (uncompressed, after HTML optimization);
+- no external stylesheets, scripts, images, fonts or iframes: everything is inline or from our
+  own origin (plain links to other sites are fine, they are not fetched);
+- a WeChat user agent gets the lite page without the flag, other browsers don't.
+
+    python check_lite.py            # exits 1 and lists failures
+"""
+
+import os
+import re
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "check-lite")  # the OpenAI client is created at import
+os.environ.setdefault("UPTIME_PROBE_ENABLED", "0")
+
+from app import SUPPORTED_LANGS, WECHAT_LITE_AUTO, WECHAT_LITE_BUDGET_BYTES, app, tenant_registry  # noqa: E402
+
+LITE_MARKER = '<symbol id="i-external"'  # from the inlined icon sprite
+WECHAT_UA = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) MicroMessenger/8.0.47"
+OTHER_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+
+# Attributes that make the browser fetch something on load.
+FETCH_RE = re.compile(
+    r"""<(link|script|img|iframe|source|video|audio|embed)\b[^>]*?\b(href|src|srcset)\s*=\s*["']?([^"'\s>]+)""",
+    re.I,
+)
+CSS_URL_RE = re.compile(r"""(?:url\(\s*["']?|@import\s+["'])(https?:)?//""", re.I)
+
+
+def check_page(html: str, label: str):
+    problems = []
+    size = len(html.encode("utf-8"))
+    if size > WECHAT_LITE_BUDGET_BYTES:
+        problems.append(f"{label}: {size} bytes, over budget of {WECHAT_LITE_BUDGET_BYTES}")
+    for tag, attr, url in FETCH_RE.findall(html):
+        if url.startswith(("http:", "https:", "//")):
+            problems.append(f"{label}: third-party <{tag} {attr}={url}>")
+    if CSS_URL_RE.search(html):
+        problems.append(f"{label}: CSS pulls a resource from another origin")
+    return problems, size
+
+
+def main() -> int:
+    client = app.test_client()
+    problems = []
+    for tenant in [tenant_registry.default] + tenant_registry.all():
+        host = tenant.hosts[0] if tenant.hosts else "localhost"
+        for lang in sorted(SUPPORTED_LANGS):
+            label = f"{tenant.id}/{lang}"
+            resp = client.get(f"/wechat?lite=1&lang={lang}", headers={"Host": host})
+            if resp.status_code != 200:
+                problems.append(f"{label}: HTTP {resp.status_code}")
+                continue
+            found, size = check_page(resp.get_data(as_text=True), label)
+            problems.extend(found)
+            print(f"{label}: {size} bytes")
+
+        if WECHAT_LITE_AUTO:
+            # Fresh clients: ?lite=1 above is remembered in the session and would decide instead.
+            auto = app.test_client().get("/wechat", headers={"Host": host, "User-Agent": WECHAT_UA})
+            if LITE_MARKER not in auto.get_data(as_text=True):
+                problems.append(f"{tenant.id}: WeChat user agent did not get the lite page")
+            other = app.test_client().get("/wechat", headers={"Host": host, "User-Agent": OTHER_UA})
+            if LITE_MARKER in other.get_data(as_text=True):
+                problems.append(f"{tenant.id}: a non-WeChat user agent got the lite page")
+
+    for p in problems:
+        print(p)
+    if problems:
+        print(f"{len(problems)} lite page problem(s)")
+        return 1
+    print(f"lite page OK (budget {WECHAT_LITE_BUDGET_BYTES} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+check_static.py
+Build-time check: every url_for('static', filename='...') / inline_static('...') in the templates
+must exist.
+
+    python check_static.py            # exits 1 and lists missing files
+
+Scans templates/ and tenant template overrides (tenants/<id>/templates/).
+"""
+
+import os
+import re
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, "static")
+
+STATIC_REF_RE = re.compile(
+    r"""(?:url_for\(\s*['"]static['"]\s*,\s*filename\s*=\s*|inline_static\(\s*)['"]([^'"]+)['"]"""
+)
+
+
+def template_files(root: str = ROOT):
+    dirs = [os.path.join(root, "templates")]
+    tenants_dir = os.environ.get("TENANTS_DIR", os.path.join(root, "tenants"))
+    if os.path.isdir(tenants_dir):
+        for name in sorted(os.listdir(tenants_dir)):
+            d = os.path.join(tenants_dir, name, "templates")
+            if os.path.isdir(d):
+                dirs.append(d)
+
+    for d in dirs:
+        for dirpath, _, filenames in os.walk(d):
+            for fn in sorted(filenames):
+                if fn.endswith((".html", ".xml", ".txt", ".j2")):
+                    yield os.path.join(dirpath, fn)
+
+
+def find_missing(root: str = ROOT, static_dir: str = STATIC_DIR):
+    """Returns [(template_path, line_no, filename), ...] for references with no file behind them."""
+    missing = []
+    for path in template_files(root):
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                for ref in STATIC_REF_RE.findall(line):
+                    if not os.path.isfile(os.path.join(static_dir, ref)):
+                        missing.append((os.path.relpath(path, root), line_no, ref))
+    return missing
+
+
+def main() -> int:
+    missing = find_missing()
+    for path, line_no, ref in missing:
+        print(f"{path}:{line_no}: missing static file '{ref}'")
+    if missing:
+        print(f"{len(missing)} missing static reference(s)")
+        return 1
+    print("static references OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
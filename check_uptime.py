@@ -0,0 +1,149 @@
+"""
+check_uptime.py
+Check for the uptime prober against local HTTP stand-ins (no network needed):
+
+- an up site, a 503, a redirect, a refused port and one that never answers are each
+  summarized correctly (status, status code, error);
+- the prober's loop reuses its keep-alive connection round after round;
+- start() called from many threads at once runs a single prober loop;
+- probers sharing a state_dir (one per worker process) run a single loop between them, all
+  serve the same snapshot, and another one takes over when the lock holder stops.
+
+    python check_uptime.py            # exits 1 and lists failures
+"""
+
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from uptime import UptimeProber
+
+TIMEOUT = 1.0
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = set()
+
+    def setup(self):
+        super().setup()
+        StandIn.connections.add(self.client_address)
+
+    def do_HEAD(self):
+        if self.path == "/hang":
+            time.sleep(TIMEOUT * 3)
+            return
+        code = {"/down": 503, "/moved": 301}.get(self.path, 200)
+        self.send_response(code)
+        if code == 301:
+            self.send_header("Location", "/")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def check_shared_state(sites) -> list:
+    problems = []
+    with tempfile.TemporaryDirectory() as state_dir:
+        # Separate open() calls on the lock file conflict like separate processes would.
+        workers = [UptimeProber(sites, interval=0.2, timeout=TIMEOUT, state_dir=state_dir) for _ in range(3)]
+        for w in workers:
+            w.start()
+        leaders = [w for w in workers if w._thread is not None]
+        if len(leaders) != 1:
+            problems.append(f"shared state_dir: {len(leaders)} probing workers, expected 1")
+            for w in workers:
+                w.stop()
+            return problems
+        time.sleep(0.5)
+        leader = leaders[0]
+        leader.stop()
+        followers = [w for w in workers if w is not leader]
+        if any(w.snapshot() != leader._snapshot for w in followers) or not leader._snapshot:
+            problems.append("shared state_dir: workers serve different snapshots")
+
+        followers[0]._next_claim = 0.0  # don't wait out the retry interval
+        followers[0].start()
+        if followers[0]._thread is None:
+            problems.append("shared state_dir: no worker took over after the prober stopped")
+        for w in workers:
+            w.stop()
+    return problems
+
+
+def main() -> int:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    sites = [
+        {"id": "up", "url": base + "/"},
+        {"id": "down", "url": base + "/down"},
+        {"id": "moved", "url": base + "/moved"},
+        {"id": "refused", "url": f"http://127.0.0.1:{free_port()}/"},
+        {"id": "hang", "url": base + "/hang"},
+    ]
+    # site id -> (status, status code, error starts with)
+    expected = {
+        "up": ("online", 200, None),
+        "down": ("down", 503, None),
+        "moved": ("online", 301, None),
+        "refused": ("down", None, "ConnectionRefusedError"),
+        "hang": ("down", None, "TimeoutError"),
+    }
+    problems = []
+
+    prober = UptimeProber(sites, timeout=TIMEOUT, concurrency=len(sites))
+    for round_no in (1, 2):
+        snapshot = prober.probe_now()
+        for site_id, (status, code, error) in expected.items():
+            s = snapshot.get(site_id) or {}
+            got = (s.get("status"), s.get("status_code"), s.get("error"))
+            if got[:2] != (status, code) or (error is None) != (got[2] is None) \
+                    or (error and not got[2].startswith(error)):
+                problems.append(f"round {round_no}: {site_id}: got {got}, expected {(status, code, error)}")
+
+    # The pool keeps one idle connection per host, so loop over a single site.
+    StandIn.connections.clear()
+    looping = UptimeProber(sites[:1], interval=0.2, timeout=TIMEOUT)
+    go = threading.Barrier(16)
+    starters = [threading.Thread(target=lambda: (go.wait(), looping.start())) for _ in range(16)]
+    for t in starters:
+        t.start()
+    for t in starters:
+        t.join()
+    running = [t for t in threading.enumerate() if t.name == "uptime-prober"]
+    if len(running) != 1:
+        problems.append(f"start() from 16 threads: {len(running)} prober loops")
+    time.sleep(1.0)  # several rounds
+    looping.stop()
+    rounds = len(looping.snapshot().get("up", {}).get("sparkline", "").split())
+    if rounds < 3 or len(StandIn.connections) != 1:
+        problems.append(f"prober loop: {len(StandIn.connections)} connection(s) in {rounds} rounds, expected 1")
+
+    problems.extend(check_shared_state(sites[:1]))
+
+    server.shutdown()
+    for p in problems:
+        print(p)
+    if problems:
+        print(f"{len(problems)} uptime problem(s)")
+        return 1
+    print("uptime prober OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+compression.py
+WSGI response compression (brotli / gzip).
+
+- Negotiates from Accept-Encoding (brotli only when the `brotli` package is installed).
+- Bodies below `min_size`, non-text types, already-encoded and no-transform responses pass through.
+- Responses with a Content-Length are compressed once and cached:
+    * keyed by (host, path, ETag) when the response carries an ETag — the body is not even read on a hit;
+    * otherwise keyed by a hash of the body, so identical pages (cached views) are not recompressed.
+- Responses without a Content-Length (generators, SSE) are compressed chunk by chunk and flushed
+  after every chunk, so nothing is buffered and events are not delayed.
+- Strong ETags get an encoding suffix ("abc" -> "abc-gzip"). The suffix is taken off
+  If-None-Match before the app sees it (and put back on the 304), so revalidation still works.
+- Buffered responses get a Server-Timing "compress" entry; totals are in `stats()`.
+"""
+
+import hashlib
+import itertools
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = (
+    "text/html",
+    "text/plain",
+    "text/csv",
+    "text/css",
+    "text/xml",
+    "text/event-stream",
+    "application/json",
+    "application/xml",
+    "text/javascript",
+    "application/javascript",
+    "application/manifest+json",
+    "image/svg+xml",
+)
+
+SKIP_STATUS = {204, 206, 304}
+
+
+def _etag_suffix(encoding: str) -> str:
+    return "-" + encoding + '"'
+
+
+def _strip_etag_suffix(value: str, encoding: str):
+    """If-None-Match with this encoding's suffix removed; None if nothing was changed."""
+    suffix = _etag_suffix(encoding)
+    tags = [t.strip() for t in value.split(",")]
+    stripped = [t[:-len(suffix)] + '"' if not t.startswith("W/") and t.endswith(suffix) else t for t in tags]
+    return ", ".join(stripped) if stripped != tags else None
+
+
+def negotiate(accept_encoding: str):
+    """Pick "br", "gzip" or None from an Accept-Encoding header."""
+    q = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[name.strip()] = weight
+
+    star = q.get("*", 0.0)
+    candidates = (("br", "gzip") if brotli is not None else ("gzip",))
+    best = None
+    best_q = 0.0
+    for enc in candidates:
+        w = q.get(enc, star)
+        if w > best_q:
+            best, best_q = enc, w
+    return best
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._c = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._c.finish()
+        return self._c.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size: int = 1024, cache_bytes: int = 8 * 1024 * 1024,
+                 gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.min_size = min_size
+        self.cache_bytes = cache_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._cache = OrderedDict()  # key -> compressed bytes (LRU)
+        self._cache_size = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "responses": 0,
+            "cache_hits": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "compress_seconds": 0.0,
+            "streamed": 0,
+        }
+
+    # -------------------------
+    # Stats / cache
+    # -------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["cache_entries"] = len(self._cache)
+            s["cache_bytes"] = self._cache_size
+        return s
+
+    def _count(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    def _cache_get(self, key):
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+            return body
+
+    def _cache_put(self, key, body: bytes):
+        if len(body) > self.cache_bytes // 8:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = body
+            self._cache_size += len(body)
+            while self._cache_size > self.cache_bytes:
+                _, old = self._cache.popitem(last=False)
+                self._cache_size -= len(old)
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return zlib.compress(body, self.gzip_level, wbits=31)
+
+    # -------------------------
+    # WSGI
+    # -------------------------
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None or environ.get("REQUEST_METHOD") == "HEAD":
+            return self.app(environ, start_response)
+
+        # Clients revalidate with the suffixed ETag we sent; the app only knows its own.
+        if_none_match = _strip_etag_suffix(environ.get("HTTP_IF_NONE_MATCH", ""), encoding)
+        if if_none_match is not None:
+            environ["HTTP_IF_NONE_MATCH"] = if_none_match
+
+        captured = []
+        writes = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return writes.append
+
+        app_iter = self.app(environ, capture)
+        status, headers, exc_info = captured
+        lower = {k.lower(): v for k, v in headers}
+
+        if not self._should_compress(status, lower):
+            if if_none_match is not None and status.startswith("304"):
+                headers = self._suffixed_etag(headers, encoding)
+            start_response(status, headers, exc_info)
+            return self._with_writes(writes, app_iter)
+
+        length = lower.get("content-length")
+        if length is None:
+            return self._stream(encoding, status, headers, exc_info, writes, app_iter, start_response)
+
+        if int(length) < self.min_size:
+            start_response(status, headers, exc_info)
+            return self._with_writes(writes, app_iter)
+
+        return self._buffered(environ, encoding, status, headers, lower, exc_info,
+                              writes, app_iter, start_response)
+
+    def _should_compress(self, status: str, lower: dict) -> bool:
+        try:
+            code = int(status.split(" ", 1)[0])
+        except ValueError:
+            return False
+        if code in SKIP_STATUS or code < 200:
+            return False
+        if "content-encoding" in lower:
+            return False
+        if "no-transform" in lower.get("cache-control", "").lower():
+            return False
+        ctype = lower.get("content-type", "").split(";", 1)[0].strip().lower()
+        return ctype in COMPRESSIBLE_TYPES
+
+    @staticmethod
+    def _with_writes(writes, app_iter):
+        if not writes:
+            return app_iter
+
+        def gen():
+            try:
+                yield from writes
+                yield from app_iter
+            finally:
+                if hasattr(app_iter, "close"):
+                    app_iter.close()
+        return gen()
+
+    @staticmethod
+    def _suffixed_etag(headers, encoding: str):
+        # A strong ETag must differ per encoding.
+        return [(k, v[:-1] + _etag_suffix(encoding))
+                if k.lower() == "etag" and not v.startswith("W/") and v.endswith('"') else (k, v)
+                for k, v in headers]
+
+    @classmethod
+    def _headers_for(cls, headers, encoding: str, length=None, timing_ms=None):
+        out = []
+        vary = None
+        for k, v in cls._suffixed_etag(headers, encoding):
+            kl = k.lower()
+            if kl == "content-length":
+                continue
+            if kl == "vary":
+                vary = v
+                continue
+            out.append((k, v))
+        if vary and "accept-encoding" not in vary.lower():
+            vary = vary + ", Accept-Encoding"
+        out.append(("Vary", vary or "Accept-Encoding"))
+        out.append(("Content-Encoding", encoding))
+        if length is not None:
+            out.append(("Content-Length", str(length)))
+        if timing_ms is not None:
+            out.append(("Server-Timing", f"compress;dur={timing_ms:.2f}"))
+        return out
+
+    def _buffered(self, environ, encoding, status, headers, lower, exc_info,
+                  writes, app_iter, start_response):
+        etag = lower.get("etag")
+        key = None
+        body = None
+        if etag:
+            key = ("etag", environ.get("HTTP_HOST", ""), environ.get("PATH_INFO", ""),
+                   environ.get("QUERY_STRING", ""), etag, encoding)
+            compressed = self._cache_get(key)
+            if compressed is not None:
+                if hasattr(app_iter, "close"):
+                    app_iter.close()
+                return self._send_cached(compressed, int(lower["content-length"]), encoding,
+                                         status, headers, exc_info, start_response)
+
+        try:
+            body = b"".join(writes) + b"".join(app_iter)
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+
+        if key is None:
+            key = ("body", hashlib.blake2b(body, digest_size=16).digest(), encoding)
+            compressed = self._cache_get(key)
+            if compressed is not None:
+                return self._send_cached(compressed, len(body), encoding,
+                                         status, headers, exc_info, start_response)
+
+        started = time.perf_counter()
+        compressed = self._compress(body, encoding)
+        elapsed = time.perf_counter() - started
+        self._count(responses=1, bytes_in=len(body), bytes_out=len(compressed), compress_seconds=elapsed)
+
+        if len(compressed) >= len(body):
+            start_response(status, headers, exc_info)
+            return [body]
+
+        self._cache_put(key, compressed)
+        start_response(status, self._headers_for(headers, encoding, len(compressed), elapsed * 1000.0), exc_info)
+        return [compressed]
+
+    def _send_cached(self, compressed, original_len, encoding, status, headers, exc_info, start_response):
+        self._count(responses=1, cache_hits=1, bytes_in=original_len, bytes_out=len(compressed))
+        start_response(status, self._headers_for(headers, encoding, len(compressed), 0.0), exc_info)
+        return [compressed]
+
+    def _stream(self, encoding, status, headers, exc_info, writes, app_iter, start_response):
+        start_response(status, self._headers_for(headers, encoding), exc_info)
+        compressor = _StreamCompressor(encoding, self.gzip_level, self.brotli_quality)
+        self._count(streamed=1)
+
+        def gen():
+            try:
+                for data in itertools.chain(writes, app_iter):
+                    if data:
+                        out = compressor.chunk(data)
+                        if out:
+                            yield out
+                yield compressor.finish()
+            finally:
+                if hasattr(app_iter, "close"):
+                    app_iter.close()
+        return gen()
@@ -0,0 +1,188 @@
+"""
+export.py
+Streaming CSV / XLSX writers for the dashboard exports.
+
+Both take a header and an iterable of rows and return a generator of byte chunks. Rows are
+pulled one at a time and a chunk goes out about every CHUNK_BYTES, so memory stays flat
+whatever the row count (Flask sends the generator with chunked transfer encoding).
+
+- CSV: UTF-8 with a BOM (so Excel shows Chinese headers correctly), RFC 4180 quoting.
+  Text starting with = + - @, tab or carriage return gets a leading apostrophe so spreadsheets
+  don't run it as a formula.
+- XLSX: a minimal SpreadsheetML package written through zipfile into a non-seekable sink
+  (sizes go into data descriptors, ZIP64 on). Strings are stored inline instead of in a
+  shared-strings table, so nothing accumulates per row. Excel shows at most 1,048,576 rows.
+
+Numbers (int / float) stay numbers in both formats; None is an empty cell.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+CHUNK_BYTES = 64 * 1024
+
+_FORMULA_START = ("=", "+", "-", "@", "\t", "\r")
+_XML_ILLEGAL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+# -------------------------
+# CSV
+# -------------------------
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, str) and value.startswith(_FORMULA_START):
+        return "'" + value
+    return value
+
+
+def csv_stream(header, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    yield b"\xef\xbb\xbf" + buf.getvalue().encode("utf-8")
+    buf.seek(0)
+    buf.truncate()
+    for row in rows:
+        writer.writerow([_csv_cell(v) for v in row])
+        if buf.tell() >= CHUNK_BYTES:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+# -------------------------
+# XLSX
+# -------------------------
+_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_CONTENT_TYPES = _XML_DECL + (
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    "</Types>"
+)
+_ROOT_RELS = _XML_DECL + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_WORKBOOK_RELS = _XML_DECL + (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+    "</Relationships>"
+)
+# Style 0: default, style 1: bold (header row).
+_STYLES = _XML_DECL + (
+    f'<styleSheet xmlns="{_NS}">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+_SHEET_START = _XML_DECL + (
+    f'<worksheet xmlns="{_NS}"><sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    "</sheetView></sheetViews><sheetData>"
+)
+_SHEET_END = "</sheetData></worksheet>"
+
+
+class _Sink:
+    """Write-only, non-seekable file object; the streamer takes out what zipfile wrote so far."""
+
+    def __init__(self):
+        self._parts = []
+        self.size = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        self.size = 0
+        return data
+
+
+def _column_letters(n: int) -> list:
+    letters = []
+    for i in range(n):
+        name = ""
+        i += 1
+        while i:
+            i, rem = divmod(i - 1, 26)
+            name = chr(65 + rem) + name
+        letters.append(name)
+    return letters
+
+
+def _xlsx_row(cols, r: int, row, style: str = "") -> str:
+    cells = []
+    for col, value in zip(cols, row):
+        if value is None or value == "":
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{col}{r}"{style}><v>{value}</v></c>')
+        else:
+            text = escape(_XML_ILLEGAL.sub("", str(value)))
+            cells.append(f'<c r="{col}{r}"{style} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{r}">{"".join(cells)}</row>'
+
+
+def xlsx_stream(header, rows, sheet_name: str = "Sheet1"):
+    sink = _Sink()
+    zf = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED)
+    workbook = _XML_DECL + (
+        f'<workbook xmlns="{_NS}" xmlns:r="{_REL_NS}"><sheets>'
+        f'<sheet name="{escape(sheet_name[:31], {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/>'
+        "</sheets></workbook>"
+    )
+    for name, content in (("[Content_Types].xml", _CONTENT_TYPES), ("_rels/.rels", _ROOT_RELS),
+                          ("xl/workbook.xml", workbook), ("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS),
+                          ("xl/styles.xml", _STYLES)):
+        zf.writestr(name, content)
+
+    cols = _column_letters(len(header))
+    with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+        pending = [_SHEET_START, _xlsx_row(cols, 1, header, ' s="1"')]
+        pending_chars = 0
+        for r, row in enumerate(rows, start=2):
+            xml = _xlsx_row(cols, r, row)
+            pending.append(xml)
+            pending_chars += len(xml)
+            if pending_chars >= CHUNK_BYTES:
+                sheet.write("".join(pending).encode("utf-8"))
+                pending.clear()
+                pending_chars = 0
+                if sink.size >= CHUNK_BYTES:
+                    yield sink.take()
+        pending.append(_SHEET_END)
+        sheet.write("".join(pending).encode("utf-8"))
+    zf.close()
+    yield sink.take()
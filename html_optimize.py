@@ -0,0 +1,283 @@
+"""
+html_optimize.py
+Post-render optimization for full HTML pages (runs in after_request).
+
+- Minifies markup: drops comments, collapses whitespace, strips it around block-level tags.
+  <pre>, <textarea> and <script> content is left untouched; inline <style> is CSS-minified.
+- Critical CSS: rules from *local* stylesheets that match the above-the-fold markup
+  (first `fold_bytes` of <body>) are inlined into <head>; the full sheets load asynchronously.
+- Third-party stylesheets on `async_hosts` (web fonts, icon fonts) are made non-blocking too.
+  Anything else (e.g. Bootstrap from the CDN) stays render-blocking: its layout is needed
+  for first paint and we cannot read it locally to extract a critical subset.
+
+Critical CSS is cached per (key, stylesheet mtimes); the optimized page per (key, hash of the
+rendered HTML), where key is (tenant, template, lang).
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+
+# Whitespace next to these never renders. Inline elements (svg, br, canvas, select, option,
+# textarea, ...) are not listed: a space between them and text is visible.
+BLOCK_TAGS = (
+    "html|head|body|title|meta|link|base|style|script|noscript|div|p|ul|ol|li|dl|dt|dd|nav|"
+    "section|article|aside|header|footer|main|form|fieldset|legend|table|thead|tbody|tfoot|"
+    "tr|td|th|h[1-6]|hr|figure|figcaption|blockquote|details|summary"
+)
+
+_PROTECTED_RE = re.compile(r"<(pre|textarea|script|style)\b[^>]*>.*?</\1\s*>", re.S | re.I)
+_COMMENT_RE = re.compile(r"<!--(?!\[if|<!).*?-->", re.S)
+_WS_RE = re.compile(r"\s+")
+_WS_BEFORE_BLOCK_RE = re.compile(r"\s+(</?(?:%s)\b)" % BLOCK_TAGS, re.I)
+_WS_AFTER_BLOCK_RE = re.compile(r"(</?(?:%s)\b[^>]*>)\s+" % BLOCK_TAGS, re.I)
+
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_CSS_WS_RE = re.compile(r"\s*([{};:,>])\s*")
+
+_LINK_RE = re.compile(r"<link\b[^>]*>", re.I)
+_ATTR_RE = re.compile(r"""([\w:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+_TAG_RE = re.compile(r"<([a-zA-Z][\w-]*)")
+_CLASS_RE = re.compile(r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.I)
+_ID_RE = re.compile(r"""\bid\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.I)
+
+_PSEUDO_RE = re.compile(r"::?[\w-]+(?:\([^)]*\))?")
+_ATTR_SEL_RE = re.compile(r"\[[^\]]*\]")
+_COMBINATOR_RE = re.compile(r"[\s>+~]+")
+
+
+# -------------------------
+# Minification
+# -------------------------
+def minify_css(css: str) -> str:
+    css = _CSS_COMMENT_RE.sub("", css)
+    css = _WS_RE.sub(" ", css)
+    css = _CSS_WS_RE.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_html(html: str) -> str:
+    protected = []
+
+    def stash(m):
+        block = m.group(0)
+        if m.group(1).lower() == "style":
+            open_end = block.index(">") + 1
+            close_start = block.lower().rindex("</style")
+            block = block[:open_end] + minify_css(block[open_end:close_start]) + block[close_start:]
+        protected.append(block)
+        return f"\x00{len(protected) - 1}\x00"
+
+    html = _PROTECTED_RE.sub(stash, html)
+    html = _COMMENT_RE.sub("", html)
+    html = _WS_RE.sub(" ", html)
+    html = _WS_BEFORE_BLOCK_RE.sub(r"\1", html)
+    html = _WS_AFTER_BLOCK_RE.sub(r"\1", html)
+    # <textarea> is inline: keep (collapsed) whitespace around it.
+    html = re.sub(r"\s*(\x00\d+\x00)\s*",
+                  lambda m: m.group(0) if protected[int(m.group(1)[1:-1])][:9].lower() == "<textarea"
+                  else m.group(1), html)
+    return re.sub(r"\x00(\d+)\x00", lambda m: protected[int(m.group(1))], html).strip()
+
+
+# -------------------------
+# Critical CSS
+# -------------------------
+def parse_css(css: str, i: int = 0):
+    """
+    Tiny CSS block parser: returns ([node, ...], end) where node is
+    ("rule", selector, body) or ("group", at_prelude, [children]).
+    """
+    nodes = []
+    n = len(css)
+    while i < n:
+        brace = css.find("{", i)
+        close = css.find("}", i)
+        if close != -1 and (brace == -1 or close < brace):
+            return nodes, close + 1
+        if brace == -1:
+            break
+
+        prelude = css[i:brace].strip()
+        # Drop statement at-rules (@import ...; @charset ...;) sitting before the prelude.
+        while prelude.startswith("@") and ";" in prelude:
+            prelude = prelude.split(";", 1)[1].strip()
+
+        at = prelude.split(None, 1)[0].lower() if prelude.startswith("@") else ""
+        if at and at not in ("@font-face", "@page"):
+            children, i = parse_css(css, brace + 1)
+            nodes.append(("group", prelude, children))
+        else:
+            end = css.find("}", brace)
+            if end == -1:
+                break
+            nodes.append(("rule", prelude, css[brace + 1:end].strip()))
+            i = end + 1
+    return nodes, n
+
+
+def page_tokens(html: str) -> dict:
+    classes = set()
+    for m in _CLASS_RE.finditer(html):
+        classes.update((m.group(1) or m.group(2) or "").split())
+    ids = {(m.group(1) or m.group(2) or "").strip() for m in _ID_RE.finditer(html)}
+    tags = {t.lower() for t in _TAG_RE.findall(html)}
+    return {"classes": classes, "ids": ids, "tags": tags}
+
+
+def selector_matches(selector: str, tokens: dict) -> bool:
+    for sel in selector.split(","):
+        sel = _ATTR_SEL_RE.sub("", _PSEUDO_RE.sub("", sel)).strip()
+        ok = True
+        for compound in _COMBINATOR_RE.split(sel):
+            if not compound or compound == "*":
+                continue
+            tag = re.match(r"^[a-zA-Z][\w-]*", compound)
+            if tag and tag.group(0).lower() not in tokens["tags"]:
+                ok = False
+                break
+            if any(c not in tokens["classes"] for c in re.findall(r"\.([\w-]+)", compound)):
+                ok = False
+                break
+            if any(i not in tokens["ids"] for i in re.findall(r"#([\w-]+)", compound)):
+                ok = False
+                break
+        if ok:
+            return True
+    return False
+
+
+def critical_css(css: str, tokens: dict) -> str:
+    nodes, _ = parse_css(_CSS_COMMENT_RE.sub("", css))
+    kept_text = []
+
+    def select(nodes):
+        out = []
+        keyframes = []
+        for node in nodes:
+            kind, prelude, body = node
+            if kind == "rule":
+                if prelude.lower() == "@font-face" or selector_matches(prelude, tokens):
+                    out.append(f"{prelude}{{{body}}}")
+                    kept_text.append(body)
+            elif prelude.lower().startswith(("@keyframes", "@-webkit-keyframes")):
+                keyframes.append(node)
+            else:
+                inner = select(body)
+                if inner:
+                    out.append(f"{prelude}{{{''.join(inner)}}}")
+        # Keep only animations the kept rules actually use.
+        used = " ".join(kept_text)
+        for _, prelude, body in keyframes:
+            name = prelude.split(None, 1)[1].strip() if " " in prelude else ""
+            if name and name in used:
+                out.append(f"{prelude}{{{''.join(f'{s}{{{b}}}' for _, s, b in body)}}}")
+        return out
+
+    return minify_css("".join(select(nodes)))
+
+
+class HtmlOptimizer:
+    def __init__(self, static_url_path: str, static_folder: str, fold_bytes: int = 12000,
+                 async_hosts=("fonts.googleapis.com", "cdnjs.cloudflare.com"), max_entries: int = 256):
+        self.static_url_path = static_url_path.rstrip("/") + "/"
+        self.static_folder = static_folder
+        self.fold_bytes = fold_bytes
+        self.async_hosts = tuple(async_hosts)
+        self.max_entries = max_entries
+        self._pages = OrderedDict()   # (key, html hash) -> optimized html
+        self._critical = {}           # (key, sheets signature) -> css
+        self._sheets = {}             # path -> (mtime_ns, css)
+        self._lock = threading.Lock()
+
+    def _local_path(self, href: str):
+        path = urlsplit(href).path
+        if not path.startswith(self.static_url_path):
+            return None
+        rel = path[len(self.static_url_path):]
+        full = os.path.normpath(os.path.join(self.static_folder, rel))
+        if not full.startswith(os.path.normpath(self.static_folder) + os.sep):
+            return None
+        return full if os.path.isfile(full) else None
+
+    def _read_sheet(self, path: str):
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._sheets.get(path)
+        if cached and cached[0] == mtime:
+            return mtime, cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            css = f.read()
+        self._sheets[path] = (mtime, css)
+        return mtime, css
+
+    @staticmethod
+    def _async_link(tag: str, href: str) -> str:
+        return (
+            f'<link rel="preload" href="{href}" as="style" '
+            f'onload="this.onload=null;this.rel=\'stylesheet\'">'
+            f"<noscript>{tag}</noscript>"
+        )
+
+    def _rewrite_head(self, html: str, key) -> str:
+        head_end = html.lower().find("</head>")
+        if head_end == -1:
+            return html
+        head = html[:head_end]
+
+        local = []  # (match, href, path)
+        third_party = []
+        for m in _LINK_RE.finditer(head):
+            attrs = {a.lower(): (v1 if v1 is not None else v2) for a, v1, v2 in _ATTR_RE.findall(m.group(0))}
+            if (attrs.get("rel") or "").lower() != "stylesheet" or not attrs.get("href"):
+                continue
+            href = attrs["href"]
+            path = self._local_path(href)
+            if path:
+                local.append((m, href, path))
+            elif urlsplit(href).hostname in self.async_hosts:
+                third_party.append((m, href))
+
+        critical = ""
+        if local:
+            sheets = [(path,) + self._read_sheet(path) for _, _, path in local]
+            ck = (key, tuple((p, mt) for p, mt, _ in sheets))
+            critical = self._critical.get(ck)
+            if critical is None:
+                body_start = html.lower().find("<body")
+                fold = html[:(body_start if body_start != -1 else 0) + self.fold_bytes]
+                tokens = page_tokens(fold)
+                critical = "".join(critical_css(css, tokens) for _, _, css in sheets)
+                self._critical[ck] = critical
+
+        replacements = [(m.start(), m.end(), self._async_link(m.group(0), href)) for m, href in third_party]
+        for n, (m, href, _) in enumerate(local):
+            repl = self._async_link(m.group(0), href)
+            if n == 0 and critical:
+                repl = f"<style data-critical>{critical}</style>" + repl
+            replacements.append((m.start(), m.end(), repl))
+
+        for start, end, repl in sorted(replacements, reverse=True):
+            head = head[:start] + repl + head[end:]
+        return head + html[head_end:]
+
+    def optimize(self, html: str, key) -> str:
+        """key identifies the page variant, e.g. (tenant_id, template_name, lang)."""
+        digest = hashlib.blake2b(html.encode("utf-8"), digest_size=16).digest()
+        pk = (key, digest)
+        with self._lock:
+            cached = self._pages.get(pk)
+            if cached is not None:
+                self._pages.move_to_end(pk)
+                return cached
+
+        out = minify_html(self._rewrite_head(html, key))
+
+        with self._lock:
+            self._pages[pk] = out
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return out
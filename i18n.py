@@ -0,0 +1,363 @@
+"""
+i18n.py
+Message catalogs: locales/<lang>.json sources compiled into one memory-mapped lookup table.
+
+    python i18n.py compile            # locales/*.json -> locales/messages.bin (build step)
+    python i18n.py check              # also lists template messages a catalog does not translate
+
+Source catalog (one file per language):
+    {"@name": "中文", "@html_lang": "zh-CN", "@aliases": ["cn", "zh-cn"], "@fallback": ["en"],
+     "messages": {"support.hours": "...", "Add-ons": "增值选项", "package.pkg_tea.bullets": ["...", "..."]}}
+
+Keys are structured ids for data ("project.<id>.desc") or, in templates, the English text itself
+(gettext style: {{ _("Add-ons") }}); a template message nobody translates renders as written.
+Where the same English text is translated differently on different pages, each use gets its own
+structured id ({{ _("dashboard.kpi.sites") }}), defined in the source catalog too.
+
+Compiled layout (little-endian):
+    b"SLMC" | u32 version | u32 header length | header JSON | one table per language | string pool
+A table holds one (u32 offset, u32 length) slot per key, same key order for every language.
+Fallback chains are resolved at compile time, so a lookup is a dict hit for the key index plus one
+table read, whatever the number of languages. Identical strings are stored once. The file is
+mmapped read-only (forked workers share its pages) and each process decodes only the strings it
+renders, once per language (LocaleView).
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+
+MAGIC = b"SLMC"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+MISSING = 0xFFFFFFFF
+LIST_FLAG = 0x80000000
+LIST_SEP = "\x1f"
+
+COMPILED_NAME = "messages.bin"
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------
+# Build step
+# -------------------------
+def source_names(paths) -> list:
+    """What a compiled catalog records about its sources, to notice one being removed."""
+    return sorted(os.path.basename(p) for p in paths)
+
+
+def load_sources(src_dir: str) -> dict:
+    sources = {}
+    for path in sorted(glob.glob(os.path.join(src_dir, "*.json"))):
+        lang = os.path.splitext(os.path.basename(path))[0].lower()
+        with open(path, "r", encoding="utf-8") as f:
+            sources[lang] = json.load(f)
+    return sources
+
+
+def fallback_chain(lang: str, sources: dict, source_lang: str) -> list:
+    chain = []
+    todo = [lang]
+    while todo:
+        cur = todo.pop(0)
+        if cur in chain or cur not in sources:
+            continue
+        chain.append(cur)
+        todo.extend(sources[cur].get("@fallback") or [])
+    if source_lang not in chain:
+        chain.append(source_lang)
+    return chain
+
+
+def compile_catalogs(src_dir: str, out_path: str, source_lang: str = "en") -> dict:
+    """Compiles every locales/*.json into `out_path` (written atomically). Returns stats."""
+    sources = load_sources(src_dir)
+    if source_lang not in sources:
+        raise ValueError(f"no catalog for source language '{source_lang}' in {src_dir}")
+
+    langs = [source_lang] + sorted(l for l in sources if l != source_lang)
+    keys = sorted(set().union(*(s.get("messages", {}) for s in sources.values())))
+
+    pool = bytearray()
+    interned = {}
+
+    def intern(value):
+        flag = 0
+        if isinstance(value, list):
+            value, flag = LIST_SEP.join(value), LIST_FLAG
+        if not isinstance(value, str):
+            raise ValueError(f"catalog values must be strings or lists of strings, got {value!r}")
+        data = value.encode("utf-8")
+        off = interned.get(data)
+        if off is None:
+            off = interned[data] = len(pool)
+            pool.extend(data)
+        return off, len(data) | flag
+
+    meta = {}
+    tables = []
+    for lang in langs:
+        chain = fallback_chain(lang, sources, source_lang)
+        catalogs = [sources[l].get("messages", {}) for l in chain]
+        table = array("I")
+        untranslated = 0
+        for key in keys:
+            for messages in catalogs:
+                value = messages.get(key)
+                if value is not None:
+                    table.extend(intern(value))
+                    break
+            else:
+                table.extend((MISSING, 0))
+                untranslated += 1
+        if sys.byteorder == "big":
+            table.byteswap()
+        tables.append(table.tobytes())
+        src = sources[lang]
+        meta[lang] = {
+            "name": src.get("@name", lang),
+            "html_lang": src.get("@html_lang", lang),
+            "aliases": [a.lower() for a in src.get("@aliases", [])],
+            "fallback": chain,
+            "untranslated": untranslated,
+        }
+
+    header = json.dumps(
+        {"source": source_lang, "languages": langs, "meta": meta, "keys": keys,
+         "sources": source_names(glob.glob(os.path.join(src_dir, "*.json")))},
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for table in tables:
+            f.write(table)
+        f.write(pool)
+    os.replace(tmp, out_path)
+    return {"languages": langs, "keys": len(keys), "pool_bytes": len(pool), "bytes": os.path.getsize(out_path),
+            "untranslated": {l: meta[l]["untranslated"] for l in langs}}
+
+
+# -------------------------
+# Runtime
+# -------------------------
+class LocaleView:
+    """One language of a Catalog. Strings are decoded on first use and kept."""
+
+    def __init__(self, catalog: "Catalog", lang: str):
+        meta = catalog.meta[lang]
+        self.catalog = catalog
+        self.lang = lang
+        self.name = meta["name"]
+        self.html_lang = meta["html_lang"]
+        self.fallback = tuple(meta["fallback"])
+        self._cache = {}
+
+    def get(self, key: str, default=None):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        value = self.catalog.lookup(self.lang, key)
+        if value is None:
+            return default
+        self._cache[key] = value
+        return value
+
+    def gettext(self, message: str) -> str:
+        return self.get(message, message)
+
+    def ngettext(self, singular: str, plural: str, n: int) -> str:
+        return self.gettext(singular if n == 1 else plural)
+
+    def pick(self, value, key: str, default=""):
+        """
+        Tenant data may carry its own text: a literal, or an inline {"en": ..., "zh": ...} dict
+        (resolved along this language's fallback chain). Without it, the catalog `key` is used.
+        """
+        if isinstance(value, dict):
+            for lang in self.fallback:
+                if value.get(lang) is not None:
+                    return value[lang]
+            return default
+        if value is not None:
+            return value
+        return self.get(key, default)
+
+
+class Catalog:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a compiled message catalog (version {VERSION})")
+        start = HEADER.size + header_len
+        header = json.loads(self._mm[HEADER.size:start].decode("utf-8"))
+
+        self.path = path
+        self.source_lang = header["source"]
+        self.languages = tuple(header["languages"])
+        self.meta = header["meta"]
+        self.sources = header.get("sources")
+        self._index = {key: i for i, key in enumerate(header["keys"])}
+
+        table_bytes = 8 * len(self._index)
+        self._tables = {}
+        buf = memoryview(self._mm)
+        for n, lang in enumerate(self.languages):
+            raw = buf[start + n * table_bytes:start + (n + 1) * table_bytes]
+            if sys.byteorder == "little":
+                self._tables[lang] = raw.cast("I")
+            else:
+                table = array("I", raw)
+                table.byteswap()
+                self._tables[lang] = table
+        self._pool = start + len(self.languages) * table_bytes
+
+        self._aliases = {}
+        for lang in self.languages:
+            self._aliases[lang] = lang
+            for alias in self.meta[lang]["aliases"]:
+                self._aliases.setdefault(alias, lang)
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, lang: str, key: str):
+        """str, tuple of str (list messages) or None."""
+        i = self._index.get(key)
+        if i is None:
+            return None
+        table = self._tables[lang]
+        off = table[2 * i]
+        if off == MISSING:
+            return None
+        length = table[2 * i + 1]
+        start = self._pool + off
+        text = self._mm[start:start + (length & ~LIST_FLAG)].decode("utf-8")
+        return tuple(text.split(LIST_SEP)) if length & LIST_FLAG else text
+
+    def normalize(self, raw: str, default=None):
+        """Maps "zh-CN", "cn", "en-us" ... onto a compiled language, else `default`."""
+        tag = (raw or "").strip().lower().replace("_", "-")
+        if tag in self._aliases:
+            return self._aliases[tag]
+        primary = tag.split("-", 1)[0]
+        return self._aliases.get(primary, default)
+
+    def view(self, lang: str) -> LocaleView:
+        lang = lang if lang in self._tables else self.normalize(lang, self.source_lang)
+        view = self._views.get(lang)
+        if view is None:
+            with self._lock:
+                view = self._views.get(lang)
+                if view is None:
+                    view = self._views[lang] = LocaleView(self, lang)
+        return view
+
+    def views(self):
+        return [self.view(lang) for lang in self.languages]
+
+
+def _read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        magic, version, header_len = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a compiled message catalog (version {VERSION})")
+        return json.loads(f.read(header_len).decode("utf-8"))
+
+
+def _is_stale(path: str, sources) -> bool:
+    """Missing, older than a source, or compiled from a different set of sources (one was deleted)."""
+    try:
+        if os.path.getmtime(path) < max((os.path.getmtime(p) for p in sources), default=0):
+            return True
+        return _read_header(path).get("sources") != source_names(sources)
+    except (OSError, ValueError, struct.error):
+        return True
+
+
+def load_catalog(src_dir: str, path: str = None, source_lang: str = "en") -> Catalog:
+    """
+    Opens the compiled catalog, (re)compiling first if it is missing, older than a source, or
+    built from a source that has since been deleted.
+    If `path` can't be written (read-only deploy), compiles into the temp dir instead, one file
+    per source dir, shared by the workers.
+    """
+    path = path or os.path.join(src_dir, COMPILED_NAME)
+    sources = glob.glob(os.path.join(src_dir, "*.json"))
+    if not _is_stale(path, sources):
+        return Catalog(path)
+    try:
+        compile_catalogs(src_dir, path, source_lang)
+        return Catalog(path)
+    except OSError as e:
+        digest = hashlib.sha1(os.path.abspath(src_dir).encode("utf-8")).hexdigest()[:12]
+        fallback = os.path.join(tempfile.gettempdir(), f"i18n-{digest}", COMPILED_NAME)
+        logger.warning("cannot write %s (%s); using %s", path, e, fallback)
+    if _is_stale(fallback, sources):
+        os.makedirs(os.path.dirname(fallback), exist_ok=True)
+        compile_catalogs(src_dir, fallback, source_lang)
+    return Catalog(fallback)
+
+
+# -------------------------
+# CLI
+# -------------------------
+def template_messages(template_dirs):
+    """{message: [template, ...]} for every _()/gettext()/{% trans %} in the templates."""
+    from jinja2 import Environment, FileSystemLoader
+    from jinja2.ext import extract_from_ast
+
+    env = Environment(loader=FileSystemLoader(template_dirs), extensions=["jinja2.ext.i18n"])
+    found = {}
+    for name in env.list_templates(extensions=["html", "xml", "txt"]):
+        source = env.loader.get_source(env, name)[0]
+        for _, _, message in extract_from_ast(env.parse(source)):
+            if isinstance(message, str):
+                found.setdefault(message, []).append(name)
+    return found
+
+
+def main(argv) -> int:
+    root = os.path.dirname(os.path.abspath(__file__))
+    src_dir = os.environ.get("LOCALES_DIR", os.path.join(root, "locales"))
+    cmd = argv[1] if len(argv) > 1 else "compile"
+    if cmd not in ("compile", "check"):
+        print(__doc__)
+        return 2
+
+    stats = compile_catalogs(src_dir, os.path.join(src_dir, COMPILED_NAME))
+    print(f"{len(stats['languages'])} languages, {stats['keys']} keys, "
+          f"{stats['pool_bytes']} bytes of text, {stats['bytes']} bytes compiled")
+    if cmd == "compile":
+        return 0
+
+    catalog = Catalog(os.path.join(src_dir, COMPILED_NAME))
+    dirs = [os.path.join(root, "templates")]
+    messages = template_messages(dirs)
+    missing = 0
+    for lang in catalog.languages:
+        if lang == catalog.source_lang:
+            continue
+        for message, where in sorted(messages.items()):
+            if catalog.lookup(lang, message) is None:
+                missing += 1
+                print(f"{lang}: untranslated {message!r} ({', '.join(sorted(set(where)))})")
+    print(f"{missing} untranslated template message(s)")
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
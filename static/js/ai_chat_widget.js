@@ -6,6 +6,10 @@ window.SkyLaneAIChat = (function () {
 
     function init(config) {
         state.lang = config.lang || "en";
+        const launcher = document.getElementById("aiChatLauncher");
+        if (launcher) {
+            launcher.addEventListener("click", toggleWindow);
+        }
         const input = document.getElementById("aiChatInput");
         if (input) {
             input.addEventListener("keydown", function (e) {
@@ -1,20 +1,23 @@
 /* bgfx.js
    Subtle animated background for SkyLane AI Studio.
 
-   - No external dependencies
+   - No external dependencies (rendering lives in bgfx_core.js)
    - Reads theme colors from CSS variables: --accent, --accent2, --accent3
    - Respects prefers-reduced-motion
-   - Low-cost rendering (limited particle count)
+   - Adaptive: lowers particle count / frame rate, or falls back to a static
+     frame, when frames exceed the budget (data-bgfx-budget on the canvas, ms)
+   - Renders in a Web Worker via OffscreenCanvas where supported
+   - Pauses when the tab is hidden (the canvas is fixed and fills the viewport,
+     so it is never scrolled out of view)
+   - Debug overlay with the frame-time distribution: ?bgfx-debug=1
+     (or localStorage.bgfx_debug = '1')
 */
 
 (() => {
   'use strict';
 
   const canvas = document.getElementById('bgfx-canvas');
-  if (!canvas) return;
-
-  const ctx = canvas.getContext('2d', { alpha: true });
-  if (!ctx) return;
+  if (!canvas || !window.BgfxCore) return;
 
   const isWechat = (document.body && document.body.dataset && document.body.dataset.wechat === '1');
   const bgfxMode = (document.documentElement.getAttribute('data-bgfx') || '').toLowerCase(); // animate|static|auto
@@ -24,6 +27,13 @@
   const reducedMotionPref = !!(window.matchMedia && window.matchMedia('(prefers-reduced-motion: reduce)').matches);
   const reducedMotion = forceStatic ? true : (forceAnimate ? false : reducedMotionPref);
 
+  const budgetMs = parseFloat(canvas.dataset.bgfxBudget) || (isWechat ? 6 : 8);
+  // WeChat's in-app browser is usually a low-end phone: start one level down.
+  const startLevel = isWechat ? 1 : 0;
+
+  let debug = /[?&]bgfx-debug=1\b/.test(window.location.search);
+  try { debug = debug || localStorage.getItem('bgfx_debug') === '1'; } catch (e) {}
+
   const clamp = (n, a, b) => Math.max(a, Math.min(b, n));
 
   const parseColorToRGB = (raw) => {
@@ -59,189 +69,145 @@
     return { r: 245, g: 158, b: 11 };
   };
 
-  const rgba = (rgb, a) => `rgba(${rgb.r},${rgb.g},${rgb.b},${a})`;
-
   const getVar = (name, fallback) => {
     const v = getComputedStyle(document.documentElement).getPropertyValue(name);
     return (v && v.trim()) ? v.trim() : fallback;
   };
 
-  let W = 0;
-  let H = 0;
-  let DPR = 1;
-  let particles = [];
-  let palette = [];
-  let maxDist = 140;
-  let maxDist2 = maxDist * maxDist;
-  let baseDotAlpha = 0.30;
-  let baseLineAlpha = 0.16;
-
   const isMidnight = () => (document.documentElement.getAttribute('data-theme') || '').toLowerCase() === 'midnight';
 
-  const recomputePalette = () => {
-    const a1 = parseColorToRGB(getVar('--accent', '#f59e0b'));
-    const a2 = parseColorToRGB(getVar('--accent2', '#22c55e'));
-    const a3 = parseColorToRGB(getVar('--accent3', '#38bdf8'));
-    palette = [a1, a2, a3];
-
-    if (isMidnight()) {
-      baseDotAlpha = 0.42;
-      baseLineAlpha = 0.22;
-    } else {
-      baseDotAlpha = 1;
-      baseLineAlpha = 1;
-    }
-  };
-
-  const resize = () => {
-    DPR = clamp(window.devicePixelRatio || 1, 1, 2);
-    W = Math.max(1, Math.floor(window.innerWidth));
-    H = Math.max(1, Math.floor(window.innerHeight));
-
-    canvas.width = Math.floor(W * DPR);
-    canvas.height = Math.floor(H * DPR);
-    ctx.setTransform(DPR, 0, 0, DPR, 0, 0);
-
-    // Tune by device + viewport
-    maxDist = isWechat ? 110 : 140;
-    maxDist2 = maxDist * maxDist;
-
-    initParticles();
-    renderOnce();
-  };
-
-  const initParticles = () => {
-    const area = W * H;
-    const rawCount = Math.round(area / 28000);
-    const minCount = isWechat ? 22 : 28;
-    const maxCount = isWechat ? 55 : 120;
-    const count = clamp(rawCount, minCount, maxCount);
-
-    const speed = (isWechat ? 0.16 : 0.22) * (isMidnight() ? 1.0 : 0.9);
-
-    particles = Array.from({ length: count }, () => {
-      const c = palette[Math.floor(Math.random() * palette.length)] || palette[0];
-      const sign = () => (Math.random() < 0.5 ? -1 : 1);
-      return {
-        x: Math.random() * W,
-        y: Math.random() * H,
-        vx: (0.35 + Math.random() * 0.65) * speed * sign(),
-        vy: (0.35 + Math.random() * 0.65) * speed * sign(),
-        r: 0.9 + Math.random() * 1.8,
-        c
-      };
-    });
+  // Everything the renderer needs from the DOM, as plain data (so it can be posted to a worker).
+  const readConfig = () => {
+    const midnight = isMidnight();
+    return {
+      W: Math.max(1, Math.floor(window.innerWidth)),
+      H: Math.max(1, Math.floor(window.innerHeight)),
+      DPR: clamp(window.devicePixelRatio || 1, 1, 2),
+      palette: [
+        parseColorToRGB(getVar('--accent', '#f59e0b')),
+        parseColorToRGB(getVar('--accent2', '#22c55e')),
+        parseColorToRGB(getVar('--accent3', '#38bdf8'))
+      ],
+      maxDist: isWechat ? 110 : 140,
+      dotAlpha: midnight ? 0.42 : 1,
+      lineAlpha: midnight ? 0.22 : 1,
+      isWechat,
+      speed: (isWechat ? 0.16 : 0.22) * (midnight ? 1.0 : 0.9)
+    };
   };
 
-  const step = () => {
-    for (const p of particles) {
-      p.x += p.vx;
-      p.y += p.vy;
-
-      if (p.x < -10) p.x = W + 10;
-      if (p.x > W + 10) p.x = -10;
-      if (p.y < -10) p.y = H + 10;
-      if (p.y > H + 10) p.y = -10;
+  // -------------------------
+  // Debug overlay
+  // -------------------------
+  let overlay = null;
+  const showStats = (s) => {
+    if (!overlay) {
+      overlay = document.createElement('pre');
+      overlay.className = 'bgfx-debug';
+      document.body.appendChild(overlay);
     }
+    const total = s.hist.reduce((a, b) => a + b, 0) || 1;
+    const rows = s.buckets.map((label, i) => {
+      const pct = s.hist[i] * 100 / total;
+      return `${label.padStart(4)}ms ${'#'.repeat(Math.round(pct / 5)).padEnd(20)} ${pct.toFixed(0)}%`;
+    });
+    overlay.textContent = [
+      `bgfx ${s.mode} · ${s.level} · ${s.particles} particles · ${s.fps} fps`,
+      `frame p50 ${s.p50.toFixed(2)} / p90 ${s.p90.toFixed(2)} / p99 ${s.p99.toFixed(2)} ms (budget ${s.budgetMs})`
+    ].concat(rows).join('\n');
   };
 
-  const draw = () => {
-    ctx.clearRect(0, 0, W, H);
-
-    // Lines
-    for (let i = 0; i < particles.length; i++) {
-      const p = particles[i];
-      for (let j = i + 1; j < particles.length; j++) {
-        const q = particles[j];
-        const dx = p.x - q.x;
-        const dy = p.y - q.y;
-        const d2 = dx * dx + dy * dy;
-        if (d2 > maxDist2) continue;
-
-        const t = 1 - (d2 / maxDist2);
-        const a = baseLineAlpha * t;
-
-        // Blend line color between endpoints (cheap approximation)
-        const lr = (p.c.r + q.c.r) >> 1;
-        const lg = (p.c.g + q.c.g) >> 1;
-        const lb = (p.c.b + q.c.b) >> 1;
-
-        ctx.strokeStyle = `rgba(${lr},${lg},${lb},${a})`;
-        ctx.lineWidth = 1;
-        ctx.beginPath();
-        ctx.moveTo(p.x, p.y);
-        ctx.lineTo(q.x, q.y);
-        ctx.stroke();
-      }
+  // -------------------------
+  // Renderer: worker (OffscreenCanvas) or main thread
+  // -------------------------
+  const workerUrl = canvas.dataset.bgfxWorker;
+  // The worker loads the same (cache-busted) core the page did.
+  const coreUrl = canvas.dataset.bgfxCore ? new URL(canvas.dataset.bgfxCore, window.location.href).href : '';
+  const canUseWorker = !reducedMotion && !!workerUrl && !!coreUrl && !!window.Worker &&
+    typeof canvas.transferControlToOffscreen === 'function';
+
+  const createWorkerRenderer = () => {
+    let worker;
+    try {
+      worker = new Worker(workerUrl);
+    } catch (e) {
+      return null;
     }
-
-    // Dots
-    for (const p of particles) {
-      ctx.fillStyle = rgba(p.c, baseDotAlpha);
-      ctx.beginPath();
-      ctx.arc(p.x, p.y, p.r, 0, Math.PI * 2);
-      ctx.fill();
+    // After the transfer the main thread can no longer draw here, so if the worker (or the core
+    // it imports) fails to load or throws, the effect is switched off rather than left blank.
+    let failed = false;
+    worker.addEventListener('error', () => {
+      failed = true;
+      worker.terminate();
+      canvas.style.display = 'none';
+    });
+    const send = (msg) => { if (!failed) worker.postMessage(msg); };
+    const offscreen = canvas.transferControlToOffscreen();
+    worker.postMessage({
+      type: 'init',
+      canvas: offscreen,
+      coreUrl,
+      config: readConfig(),
+      budgetMs,
+      startLevel,
+      debug
+    }, [offscreen]);
+    if (debug) {
+      worker.onmessage = (e) => { if (e.data && e.data.type === 'stats') showStats(e.data.stats); };
     }
+    return {
+      configure: (cfg) => send({ type: 'configure', config: cfg }),
+      start: () => send({ type: 'start' }),
+      stop: () => send({ type: 'stop' })
+    };
   };
 
-  let raf = null;
-
-  const loop = () => {
-    raf = window.requestAnimationFrame(loop);
-    step();
-    draw();
-  };
-
-  const stop = () => {
-    if (raf) window.cancelAnimationFrame(raf);
-    raf = null;
+  const createMainRenderer = () => {
+    const ctx = canvas.getContext('2d', { alpha: true });
+    if (!ctx) return null;
+    const r = window.BgfxCore.createRenderer(ctx, {
+      budgetMs,
+      startLevel,
+      mode: 'main',
+      onStats: debug ? showStats : null
+    });
+    r.configure(readConfig());
+    return r;
   };
 
-  const renderOnce = () => {
-    // In reduced motion mode, show a static pattern (no animation).
-    draw();
-  };
+  const renderer = (canUseWorker && createWorkerRenderer()) || createMainRenderer();
+  if (!renderer) return;
 
-  const start = () => {
-    if (reducedMotion) {
-      stop();
-      renderOnce();
-      return;
+  // -------------------------
+  // Run only while the tab is shown
+  // -------------------------
+  const update = () => {
+    if (reducedMotion || document.hidden) {
+      renderer.stop();
+    } else {
+      renderer.start();
     }
-    if (!raf) loop();
   };
 
-  // Visibility pause to save CPU
-  document.addEventListener('visibilitychange', () => {
-    if (document.hidden) {
-      stop();
-    } else {
-      start();
-    }
-  });
+  document.addEventListener('visibilitychange', update);
 
   // Resize (debounced)
   let t = null;
   window.addEventListener('resize', () => {
     window.clearTimeout(t);
-    t = window.setTimeout(resize, 120);
+    t = window.setTimeout(() => renderer.configure(readConfig()), 120);
   });
 
   // Theme changes (data-theme on <html>)
   const mo = new MutationObserver((mutations) => {
     for (const m of mutations) {
       if (m.type === 'attributes' && m.attributeName === 'data-theme') {
-        recomputePalette();
-        initParticles();
-        renderOnce();
+        renderer.configure(readConfig());
         break;
       }
     }
   });
   mo.observe(document.documentElement, { attributes: true });
 
-  // Init
-  recomputePalette();
-  resize();
-  start();
+  update();
 })();
@@ -0,0 +1,296 @@
+/* bgfx_core.js
+   Shared renderer for the animated background.
+
+   - Used by bgfx.js on the main thread and by bgfx_worker.js on an OffscreenCanvas
+   - No DOM access: sizes, colors and flags are passed in by the caller
+   - Measures the cost of every frame and steps quality down (fewer particles,
+     lower frame rate, finally a single static frame) when it exceeds the budget
+*/
+
+(function (root) {
+  'use strict';
+
+  const clamp = (n, a, b) => Math.max(a, Math.min(b, n));
+
+  // Quality levels, best first. fps 0 = draw one static frame and stop.
+  const LEVELS = [
+    { name: 'full',   density: 1.0,  fps: 60 },
+    { name: 'medium', density: 0.6,  fps: 30 },
+    { name: 'low',    density: 0.35, fps: 20 },
+    { name: 'static', density: 0.35, fps: 0 }
+  ];
+
+  // Histogram bucket upper bounds (ms) for the debug overlay.
+  const BUCKETS = [2, 4, 8, 16, 33, Infinity];
+
+  const rgba = (rgb, a) => `rgba(${rgb.r},${rgb.g},${rgb.b},${a})`;
+
+  const createEngine = (ctx) => {
+    let W = 1;
+    let H = 1;
+    let DPR = 1;
+    let particles = [];
+    let palette = [{ r: 245, g: 158, b: 11 }];
+    let maxDist2 = 140 * 140;
+    let dotAlpha = 1;
+    let lineAlpha = 1;
+    let isWechat = false;
+    let speed = 0.2;
+    let density = 1;
+
+    const initParticles = () => {
+      const area = W * H;
+      const rawCount = Math.round(area / 28000);
+      const minCount = isWechat ? 22 : 28;
+      const maxCount = isWechat ? 55 : 120;
+      const count = Math.max(8, Math.round(clamp(rawCount, minCount, maxCount) * density));
+
+      particles = Array.from({ length: count }, () => {
+        const c = palette[Math.floor(Math.random() * palette.length)] || palette[0];
+        const sign = () => (Math.random() < 0.5 ? -1 : 1);
+        return {
+          x: Math.random() * W,
+          y: Math.random() * H,
+          vx: (0.35 + Math.random() * 0.65) * speed * sign(),
+          vy: (0.35 + Math.random() * 0.65) * speed * sign(),
+          r: 0.9 + Math.random() * 1.8,
+          c
+        };
+      });
+    };
+
+    // dt is in 60fps frames, so motion speed does not depend on the frame rate.
+    const step = (dt) => {
+      for (const p of particles) {
+        p.x += p.vx * dt;
+        p.y += p.vy * dt;
+
+        if (p.x < -10) p.x = W + 10;
+        if (p.x > W + 10) p.x = -10;
+        if (p.y < -10) p.y = H + 10;
+        if (p.y > H + 10) p.y = -10;
+      }
+    };
+
+    const draw = () => {
+      ctx.clearRect(0, 0, W, H);
+
+      // Lines
+      for (let i = 0; i < particles.length; i++) {
+        const p = particles[i];
+        for (let j = i + 1; j < particles.length; j++) {
+          const q = particles[j];
+          const dx = p.x - q.x;
+          const dy = p.y - q.y;
+          const d2 = dx * dx + dy * dy;
+          if (d2 > maxDist2) continue;
+
+          const t = 1 - (d2 / maxDist2);
+          const a = lineAlpha * t;
+
+          // Blend line color between endpoints (cheap approximation)
+          const lr = (p.c.r + q.c.r) >> 1;
+          const lg = (p.c.g + q.c.g) >> 1;
+          const lb = (p.c.b + q.c.b) >> 1;
+
+          ctx.strokeStyle = `rgba(${lr},${lg},${lb},${a})`;
+          ctx.lineWidth = 1;
+          ctx.beginPath();
+          ctx.moveTo(p.x, p.y);
+          ctx.lineTo(q.x, q.y);
+          ctx.stroke();
+        }
+      }
+
+      // Dots
+      for (const p of particles) {
+        ctx.fillStyle = rgba(p.c, dotAlpha);
+        ctx.beginPath();
+        ctx.arc(p.x, p.y, p.r, 0, Math.PI * 2);
+        ctx.fill();
+      }
+    };
+
+    // cfg: { W, H, DPR, palette, maxDist, dotAlpha, lineAlpha, isWechat, speed }
+    const configure = (cfg) => {
+      W = Math.max(1, cfg.W | 0);
+      H = Math.max(1, cfg.H | 0);
+      DPR = clamp(cfg.DPR || 1, 1, 2);
+      palette = (cfg.palette && cfg.palette.length) ? cfg.palette : palette;
+      maxDist2 = (cfg.maxDist || 140) * (cfg.maxDist || 140);
+      dotAlpha = cfg.dotAlpha != null ? cfg.dotAlpha : 1;
+      lineAlpha = cfg.lineAlpha != null ? cfg.lineAlpha : 1;
+      isWechat = !!cfg.isWechat;
+      speed = cfg.speed || 0.2;
+
+      ctx.canvas.width = Math.floor(W * DPR);
+      ctx.canvas.height = Math.floor(H * DPR);
+      ctx.setTransform(DPR, 0, 0, DPR, 0, 0);
+
+      initParticles();
+      draw();
+    };
+
+    const setDensity = (d) => {
+      if (d === density) return;
+      density = d;
+      initParticles();
+    };
+
+    return {
+      configure,
+      setDensity,
+      step,
+      draw,
+      count: () => particles.length
+    };
+  };
+
+  // Rolling window of frame costs; decides the quality level.
+  const createGovernor = (opts) => {
+    const budgetMs = opts.budgetMs || 8;
+    const minLevel = clamp(opts.startLevel || 0, 0, LEVELS.length - 1);
+    const size = 120;
+    const samples = new Float32Array(size);
+    const hist = new Array(BUCKETS.length).fill(0);
+    let n = 0;
+    let idx = 0;
+    let level = minLevel;
+    let lastChange = 0;
+    let calmSince = 0;
+
+    const percentile = (q) => {
+      if (!n) return 0;
+      const sorted = Array.from(samples.subarray(0, n)).sort((a, b) => a - b);
+      return sorted[Math.min(n - 1, Math.floor(q * n))];
+    };
+
+    const reset = (now) => {
+      n = 0;
+      idx = 0;
+      lastChange = now;
+      calmSince = 0;
+    };
+
+    const sample = (ms, now) => {
+      samples[idx] = ms;
+      idx = (idx + 1) % size;
+      n = Math.min(n + 1, size);
+      for (let b = 0; b < BUCKETS.length; b++) {
+        if (ms < BUCKETS[b]) { hist[b]++; break; }
+      }
+
+      // Need a full-ish window and some time since the last change before judging.
+      if (n < 30 || now - lastChange < 1000) return level;
+
+      const p90 = percentile(0.9);
+      if (p90 > budgetMs && level < LEVELS.length - 1) {
+        level++;
+        reset(now);
+      } else if (p90 < budgetMs * 0.4 && level > minLevel && LEVELS[level].fps > 0) {
+        // Only step back up after a sustained calm period.
+        if (!calmSince) calmSince = now;
+        else if (now - calmSince > 8000) { level--; reset(now); }
+      } else {
+        calmSince = 0;
+      }
+      return level;
+    };
+
+    const stats = () => ({
+      budgetMs,
+      p50: percentile(0.5),
+      p90: percentile(0.9),
+      p99: percentile(0.99),
+      hist: hist.slice(),
+      buckets: BUCKETS.map(b => (b === Infinity ? '33+' : '<' + b))
+    });
+
+    return {
+      sample,
+      stats,
+      level: () => level
+    };
+  };
+
+  // Engine + governor + frame loop. Works with window or worker rAF (or a timer fallback).
+  const createRenderer = (ctx, opts) => {
+    opts = opts || {};
+    const engine = createEngine(ctx);
+    const gov = createGovernor(opts);
+    const now = () => (root.performance ? root.performance.now() : Date.now());
+    const raf = root.requestAnimationFrame
+      ? (cb) => root.requestAnimationFrame(cb)
+      : (cb) => root.setTimeout(() => cb(now()), 16);
+    const caf = root.cancelAnimationFrame
+      ? (id) => root.cancelAnimationFrame(id)
+      : (id) => root.clearTimeout(id);
+
+    let handle = null;
+    let last = 0;
+    let frames = 0;
+    let statsAt = 0;
+
+    engine.setDensity(LEVELS[gov.level()].density);
+
+    const report = (t) => {
+      if (!opts.onStats || t - statsAt < 500) return;
+      const elapsed = t - statsAt;
+      const s = gov.stats();
+      s.fps = statsAt ? Math.round(frames * 1000 / elapsed) : 0;
+      s.level = LEVELS[gov.level()].name;
+      s.particles = engine.count();
+      s.mode = opts.mode || 'main';
+      opts.onStats(s);
+      frames = 0;
+      statsAt = t;
+    };
+
+    const loop = (t) => {
+      handle = raf(loop);
+      const lvl = LEVELS[gov.level()];
+      if (lvl.fps === 0) {
+        stop();
+        engine.draw();
+        report(t + 500);
+        return;
+      }
+      if (last && t - last < 1000 / lvl.fps - 1) return;
+
+      const dt = last ? Math.min(4, (t - last) / (1000 / 60)) : 1;
+      last = t;
+
+      const t0 = now();
+      engine.step(dt);
+      engine.draw();
+      const work = now() - t0;
+      frames++;
+
+      const before = gov.level();
+      if (gov.sample(work, t) !== before) {
+        engine.setDensity(LEVELS[gov.level()].density);
+      }
+      report(t);
+    };
+
+    const start = () => {
+      if (handle || LEVELS[gov.level()].fps === 0) return;
+      last = 0;
+      handle = raf(loop);
+    };
+
+    const stop = () => {
+      if (handle) caf(handle);
+      handle = null;
+    };
+
+    return {
+      configure: engine.configure,
+      drawOnce: engine.draw,
+      start,
+      stop
+    };
+  };
+
+  root.BgfxCore = { LEVELS, createRenderer };
+})(typeof self !== 'undefined' ? self : this);
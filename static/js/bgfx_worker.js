@@ -0,0 +1,37 @@
+/* bgfx_worker.js
+   Runs the animated background on an OffscreenCanvas, off the main thread.
+   bgfx.js owns everything DOM-related (sizes, theme colors, visibility) and
+   sends it here as messages, including the versioned bgfx_core.js URL so the
+   worker always runs the same core as the page.
+*/
+
+let renderer = null;
+
+self.onmessage = (e) => {
+  const m = e.data || {};
+
+  switch (m.type) {
+    case 'init': {
+      if (!self.BgfxCore) importScripts(m.coreUrl);
+      const ctx = m.canvas.getContext('2d', { alpha: true });
+      if (!ctx) return;
+      renderer = self.BgfxCore.createRenderer(ctx, {
+        budgetMs: m.budgetMs,
+        startLevel: m.startLevel,
+        mode: 'worker',
+        onStats: m.debug ? (stats) => self.postMessage({ type: 'stats', stats }) : null
+      });
+      renderer.configure(m.config);
+      break;
+    }
+    case 'configure':
+      if (renderer) renderer.configure(m.config);
+      break;
+    case 'start':
+      if (renderer) renderer.start();
+      break;
+    case 'stop':
+      if (renderer) renderer.stop();
+      break;
+  }
+};
@@ -3,8 +3,11 @@
 
 (function () {
   var STORAGE_KEY = "skylane_theme";
-  var DEFAULT_THEME = "classic";
   var THEMES = ["classic", "warm", "midnight"];
+  // Server-side default (per tenant) comes from <html data-theme="...">
+  var DEFAULT_THEME = THEMES.includes(document.documentElement.getAttribute("data-theme"))
+    ? document.documentElement.getAttribute("data-theme")
+    : "classic";
 
   function applyTheme(theme) {
     var t = THEMES.includes(theme) ? theme : DEFAULT_THEME;
@@ -0,0 +1,137 @@
+// widget_loader.js
+// Loads heavy widgets (AI chat, Smart RFQ) from /fragments/<name> only when needed.
+//
+// Launcher mode (default): <div data-widget="ai-chat" data-widget-src="/fragments/ai-chat?lang=en">
+//   - prefetched on hover/focus/touch or when the browser is idle
+//   - a click before the fragment arrives loads it, then replays the click
+// Inline mode: add data-widget-mode="inline"; the fragment replaces the placeholder's
+//   content when it scrolls near the viewport.
+//
+// Fragment <script> tags are executed in order (external ones awaited), exactly as if
+// the markup had been in the page from the start.
+
+(function () {
+  var pending = {};
+
+  function runScripts(scripts, i) {
+    if (i >= scripts.length) return Promise.resolve();
+    var old = scripts[i];
+    var s = document.createElement("script");
+    for (var a = 0; a < old.attributes.length; a++) {
+      s.setAttribute(old.attributes[a].name, old.attributes[a].value);
+    }
+    if (old.src) {
+      return new Promise(function (resolve, reject) {
+        s.onload = resolve;
+        s.onerror = reject;
+        document.body.appendChild(s);
+      }).then(function () { return runScripts(scripts, i + 1); });
+    }
+    s.text = old.text;
+    document.body.appendChild(s);
+    return runScripts(scripts, i + 1);
+  }
+
+  function load(el) {
+    var src = el.getAttribute("data-widget-src");
+    if (!src) return Promise.reject(new Error("no data-widget-src"));
+    if (pending[src]) return pending[src];
+
+    pending[src] = fetch(src, { credentials: "same-origin" })
+      .then(function (r) {
+        if (!r.ok) throw new Error("widget " + src + ": HTTP " + r.status);
+        return r.text();
+      })
+      .then(function (html) {
+        var tpl = document.createElement("template");
+        tpl.innerHTML = html;
+        var scripts = Array.prototype.slice.call(tpl.content.querySelectorAll("script"));
+        scripts.forEach(function (s) { s.parentNode.removeChild(s); });
+
+        var target = el.getAttribute("data-widget-mode") === "inline" ? el : document.body;
+        if (target === el) el.innerHTML = "";
+        target.appendChild(tpl.content);
+        el.setAttribute("data-widget-loaded", "1");
+        return runScripts(scripts, 0);
+      })
+      .catch(function (err) {
+        delete pending[src];  // allow a retry on the next interaction
+        throw err;
+      });
+    return pending[src];
+  }
+
+  function whenIdle(fn) {
+    var go = function () {
+      if ("requestIdleCallback" in window) window.requestIdleCallback(fn, { timeout: 8000 });
+      else window.setTimeout(fn, 3000);
+    };
+    if (document.readyState === "complete") go();
+    else window.addEventListener("load", go);
+  }
+
+  function initLauncher(el) {
+    var done = false;
+
+    function onClick(e) {
+      if (done) return;  // the widget's own handler takes over once loaded
+      e.preventDefault();
+      e.stopImmediatePropagation();
+      load(el).then(function () {
+        finish();
+        el.click();
+      }).catch(function () {});
+    }
+
+    function finish() {
+      if (done) return;
+      done = true;
+      el.removeEventListener("click", onClick);
+    }
+
+    function prefetch() {
+      load(el).then(finish).catch(function () {});
+    }
+
+    el.addEventListener("click", onClick);
+    el.addEventListener("keydown", function (e) {
+      if (e.key === "Enter" || e.key === " ") {
+        e.preventDefault();
+        el.click();
+      }
+    });
+    ["pointerenter", "focus", "touchstart"].forEach(function (type) {
+      el.addEventListener(type, prefetch, { once: true, passive: true });
+    });
+    whenIdle(prefetch);
+  }
+
+  function initInline(el) {
+    if (!("IntersectionObserver" in window)) {
+      whenIdle(function () { load(el).catch(function () {}); });
+      return;
+    }
+    var io = new IntersectionObserver(function (entries) {
+      if (entries.some(function (e) { return e.isIntersecting; })) {
+        io.disconnect();
+        load(el).catch(function () {});
+      }
+    }, { rootMargin: "300px" });
+    io.observe(el);
+  }
+
+  function init() {
+    document.querySelectorAll("[data-widget][data-widget-src]").forEach(function (el) {
+      if (el.getAttribute("data-widget-mode") === "inline") initInline(el);
+      else initLauncher(el);
+    });
+  }
+
+  window.SkyLaneWidgets = { load: load };
+
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", init);
+  } else {
+    init();
+  }
+})();
@@ -0,0 +1,229 @@
+"""
+tenants.py
+Host-based tenants: one process serves many client sites.
+
+- Each tenant is a JSON file in TENANTS_DIR (e.g. tenants/tea.json).
+- Keys a tenant does not set fall back to the built-in defaults *by reference*,
+  so tenants that only change a few fields cost almost nothing in memory.
+- Files are re-read when their mtime, or that of the tenant's template override directory or
+  any template in it, changes (checked at most every few seconds).
+- Localized views are cached per tenant; views built only from shared defaults
+  are cached once and shared by every tenant.
+
+Example tenant file:
+
+    {
+      "hosts": ["tea.skylaneai.com"],
+      "theme": "warm",
+      "enable_smart_rfq": false,
+      "projects": [...],
+      "ai_kb": {"agency_en": "...", "agency_zh": "..."}
+    }
+
+Optional per-tenant template overrides live in <TENANTS_DIR>/<id>/templates/
+and are loaded under the name "tenants/<id>/templates/<name>".
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Keys a tenant file may override (everything else is ignored).
+TENANT_KEYS = (
+    "projects",
+    "packages",
+    "ai_kb",
+    "enable_ai_chat",
+    "enable_smart_rfq",
+    "theme",
+    "default_lang",
+)
+
+DEFAULT_TENANT_ID = "default"
+
+
+def normalize_host(host: str) -> str:
+    host = (host or "").strip().lower()
+    if host.startswith("["):  # IPv6 literal: [::1]:5000
+        return host.split("]", 1)[0] + "]"
+    return host.split(":", 1)[0]
+
+
+class Tenant:
+    def __init__(self, tenant_id: str, data: dict, defaults: dict, shared_views: dict, template_dir=None):
+        self.id = tenant_id
+        self.hosts = tuple(normalize_host(h) for h in (data.get("hosts") or []))
+        overrides = {k for k in TENANT_KEYS if k in data}
+        if template_dir:
+            overrides.add("templates")  # views rendered from templates are then per tenant too
+        self.overrides = frozenset(overrides)
+        self.template_dir = template_dir
+        self._data = data
+        self._defaults = defaults
+        self._shared_views = shared_views
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        if key in self.overrides:
+            return self._data[key]
+        return self._defaults.get(key)
+
+    def __getattr__(self, key):
+        if key in TENANT_KEYS:
+            return self.get(key)
+        raise AttributeError(key)
+
+    def view(self, name: str, lang: str, build, *depends):
+        """
+        Return a cached localized view, building it on first use.
+        If none of `depends` is overridden by this tenant, the view is shared across tenants.
+        """
+        own = any(k in self.overrides for k in depends)
+        cache = self._views if own else self._shared_views
+        key = (name, lang)
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        value = build()
+        with self._lock:
+            return cache.setdefault(key, value)
+
+    def template_names(self, name: str):
+        """Lookup order for render: tenant override first, then the shared template."""
+        if self.template_dir:
+            return [f"tenants/{self.id}/templates/{name}", name]
+        return [name]
+
+
+class TenantRegistry:
+    def __init__(self, data_dir: str, defaults: dict, check_interval: float = 2.0, on_templates_changed=None):
+        """
+        on_templates_changed: called after a reload that saw a tenant's override templates change
+        (e.g. to drop compiled templates the renderer still caches).
+        """
+        self.data_dir = data_dir
+        self.defaults = dict(defaults)
+        self.check_interval = check_interval
+        self.on_templates_changed = on_templates_changed
+        self._shared_views = {}
+        self.default = Tenant(DEFAULT_TENANT_ID, {}, self.defaults, self._shared_views)
+        self._tenants = {}   # id -> Tenant
+        self._mtimes = {}    # filename -> _scan() signature
+        self._by_host = {}   # host -> Tenant
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    # -------------------------
+    # Lookup
+    # -------------------------
+    def resolve(self, host: str) -> Tenant:
+        if self.reload_due():
+            self.reload()
+        return self.lookup(host)
+
+    def lookup(self, host: str) -> Tenant:
+        """resolve() without the reload check, for callers that reload elsewhere (asgi.py)."""
+        return self._by_host.get(normalize_host(host), self.default)
+
+    def reload_due(self) -> bool:
+        """True at most once per check_interval; the caller is then expected to reload()."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        return True
+
+    def get(self, tenant_id: str):
+        if tenant_id == DEFAULT_TENANT_ID:
+            return self.default
+        return self._tenants.get(tenant_id)
+
+    def all(self):
+        return list(self._tenants.values())
+
+    # -------------------------
+    # Loading
+    # -------------------------
+    def _scan(self) -> dict:
+        """filename -> (file mtime, signature of the template override directory)."""
+        try:
+            entries = os.scandir(self.data_dir)
+        except OSError:
+            return {}
+        with entries:
+            files = {e.name: e.stat().st_mtime_ns for e in entries if e.is_file() and e.name.endswith(".json")}
+        return {name: (mtime, self._templates_signature(name[:-len(".json")])) for name, mtime in files.items()}
+
+    def _templates_signature(self, tenant_id: str):
+        """None without an override directory, else its mtime plus each template's (name, mtime)."""
+        template_dir = os.path.join(self.data_dir, tenant_id, "templates")
+        try:
+            # The directory's mtime covers templates added or removed; each file's covers edits.
+            dir_mtime = os.stat(template_dir).st_mtime_ns
+            files = []
+            for root, _, names in os.walk(template_dir):
+                for name in names:
+                    path = os.path.join(root, name)
+                    files.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            return None
+        return dir_mtime, tuple(sorted(files))
+
+    def _load(self, filename: str):
+        tenant_id = filename[:-len(".json")]
+        path = os.path.join(self.data_dir, filename)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            # Keep serving the previous version of a broken file.
+            logger.warning("failed to load %s: %s", path, e)
+            return self._tenants.get(tenant_id)
+        if not isinstance(data, dict):
+            logger.warning("ignoring %s: top-level value must be an object", path)
+            return self._tenants.get(tenant_id)
+
+        template_dir = os.path.join(self.data_dir, tenant_id, "templates")
+        if not os.path.isdir(template_dir):
+            template_dir = None
+        return Tenant(tenant_id, data, self.defaults, self._shared_views, template_dir)
+
+    def reload(self):
+        """Re-read tenants whose file or override directory changed; cheap when nothing did."""
+        mtimes = self._scan()
+        if mtimes == self._mtimes:
+            return
+        with self._lock:
+            if mtimes == self._mtimes:
+                return
+            tenants = {}
+            for filename, mtime in mtimes.items():
+                tenant_id = filename[:-len(".json")]
+                if self._mtimes.get(filename) == mtime and tenant_id in self._tenants:
+                    tenants[tenant_id] = self._tenants[tenant_id]
+                    continue
+                tenant = self._load(filename)
+                if tenant is not None:
+                    tenants[tenant_id] = tenant
+
+            by_host = {}
+            for tenant in tenants.values():
+                for host in tenant.hosts:
+                    by_host[host] = tenant
+
+            templates_changed = ({f: sig[1] for f, sig in mtimes.items()}
+                                 != {f: sig[1] for f, sig in self._mtimes.items()})
+
+            # Swap whole dicts so readers never see a half-built registry.
+            self._tenants = tenants
+            self._by_host = by_host
+            self._mtimes = mtimes
+        if templates_changed and self.on_templates_changed is not None:
+            self.on_templates_changed()
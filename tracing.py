@@ -0,0 +1,387 @@
+"""
+tracing.py
+Lightweight request tracing: a trace id per request, nested timed spans, and a batched
+background exporter writing OTLP/JSON lines to local files.
+
+    with tracer.span("localize_packages", lang=lang): ...
+    @tracer.wrap("get_lang")
+
+- Every request gets a trace id (X-Trace-Id response header, `trace_id` on log records).
+  Only a sampled fraction of requests (sample_rate) records spans. An incoming W3C
+  `traceparent` continues the caller's trace; its sampled flag is followed only when the
+  upstream is trusted (trust_parent_sampled), otherwise sample_rate decides, so clients
+  can't force every request to be recorded.
+- Unsampled requests pay for one random id and a context lookup per span site:
+  span() returns a shared no-op.
+- When a request finishes, its spans go to the exporter queue. A background thread
+  (batching.BatchWriter) writes them in batches, one JSON line per batch: an OTLP
+  ExportTraceServiceRequest, the line format of the OpenTelemetry collector's file
+  exporter/receiver. Files are <dir>/spans-YYYYMMDD.jsonl.
+  A full queue drops traces (counted); requests never wait for the disk.
+- Retention: day files older than retention_days are deleted by the writer thread, checked
+  every prune_interval.
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import re
+import socket
+import time
+
+from batching import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_SPAN_FILE_RE = re.compile(r"^spans-\d{8}\.jsonl$")
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, exc):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes", "status",
+                 "start_ns", "end_ns", "_t0")
+
+    def __init__(self, trace, name: str, kind: int, attributes: dict, parent_id: str = None):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.status = None
+        self.start_ns = self.end_ns = 0
+        self._t0 = 0
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, exc):
+        self.status = (STATUS_ERROR, f"{type(exc).__name__}: {exc}")
+
+    def start(self):
+        self.start_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+
+    def stop(self):
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._t0)
+        self.trace.spans.append(self)
+
+    def __enter__(self):
+        stack = self.trace.stack
+        self.parent_id = stack[-1].span_id if stack else self.parent_id
+        stack.append(self)
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(exc)
+        self.stop()
+        self.trace.stack.pop()
+        return False
+
+
+class Trace:
+    """One request. `root` is a Span when sampled, else NOOP_SPAN."""
+
+    __slots__ = ("trace_id", "sampled", "root", "spans", "stack", "token", "_t0")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.root = NOOP_SPAN
+        self.spans = []
+        self.stack = []
+        self.token = None
+        self._t0 = time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._t0) * 1000.0
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.01, exporter=None, trust_parent_sampled: bool = False):
+        """trust_parent_sampled: follow an incoming traceparent's sampled flag (trusted upstreams only)."""
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.trust_parent_sampled = trust_parent_sampled
+
+    def begin(self, name: str, traceparent: str = None, kind: int = SPAN_KIND_SERVER, **attributes) -> Trace:
+        """Starts a request's trace and makes it current. Pair with finish()."""
+        parent_id = None
+        m = _TRACEPARENT_RE.match((traceparent or "").strip().lower())
+        if m and m.group(1) != "0" * 32:
+            if self.trust_parent_sampled:
+                sampled = bool(int(m.group(3), 16) & 1)
+            else:
+                sampled = random.random() < self.sample_rate
+            trace = Trace(m.group(1), sampled)
+            parent_id = m.group(2)
+        else:
+            trace = Trace(f"{random.getrandbits(128):032x}", random.random() < self.sample_rate)
+        if trace.sampled:
+            trace.root = Span(trace, name, kind, attributes, parent_id)
+            trace.stack.append(trace.root)
+            trace.root.start()
+        trace.token = _current.set(trace)
+        return trace
+
+    def finish(self, trace: Trace, error: BaseException = None):
+        if trace.sampled:
+            if error is not None:
+                trace.root.record_error(error)
+            trace.root.stop()
+            trace.stack.clear()
+            if self.exporter is not None:
+                self.exporter.export(trace.spans)
+        try:
+            _current.reset(trace.token)
+        except ValueError:  # finished from another context (e.g. a server thread)
+            _current.set(None)
+
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+        trace = _current.get()
+        if trace is None or not trace.sampled:
+            return NOOP_SPAN
+        return Span(trace, name, kind, attributes)
+
+    def wrap(self, name: str = None):
+        """Decorator: runs the function inside a span (named after it by default)."""
+        def decorate(fn):
+            span_name = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    @staticmethod
+    def current() -> Trace:
+        return _current.get()
+
+
+def install_log_record_factory():
+    """Adds `trace_id` to every log record ("-" outside a request), for use in format strings."""
+    old = logging.getLogRecordFactory()
+    if getattr(old, "adds_trace_id", False):
+        return
+
+    def factory(*args, **kwargs):
+        record = old(*args, **kwargs)
+        trace = _current.get()
+        record.trace_id = trace.trace_id if trace else "-"
+        return record
+
+    factory.adds_trace_id = True
+    logging.setLogRecordFactory(factory)
+
+
+# -------------------------
+# WSGI
+# -------------------------
+class _ClosingIterator:
+    def __init__(self, iterable, on_close):
+        self._iterable = iterable
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def close(self):
+        try:
+            if hasattr(self._iterable, "close"):
+                self._iterable.close()
+        finally:
+            self._on_close()
+
+
+class TracingMiddleware:
+    """
+    Root span per request ("GET /path"; the app may rename it once the route is known).
+    The trace ends when the server closes the response, so streamed bodies are included.
+    Requests slower than slow_ms are logged (with their trace id) to `logger`.
+    """
+
+    def __init__(self, app, tracer: Tracer, header: str = "X-Trace-Id", slow_ms: float = 0, logger=None):
+        self.app = app
+        self.tracer = tracer
+        self.header = header
+        self.slow_ms = slow_ms
+        self.logger = logger or logging.getLogger(__name__)
+
+    def __call__(self, environ, start_response):
+        method = environ.get("REQUEST_METHOD", "GET")
+        path = environ.get("PATH_INFO") or "/"
+        trace = self.tracer.begin(
+            f"{method} {path}", environ.get("HTTP_TRACEPARENT"),
+            **{"http.request.method": method, "url.path": path},
+        )
+
+        def _start_response(status, headers, exc_info=None):
+            headers.append((self.header, trace.trace_id))
+            code = int(status.split(" ", 1)[0])
+            trace.root.set_attribute("http.response.status_code", code)
+            if code >= 500 and trace.sampled:
+                trace.root.status = (STATUS_ERROR, status)
+            return start_response(status, headers, exc_info)
+
+        try:
+            result = self.app(environ, _start_response)
+        except BaseException as e:
+            self._finish(trace, f"{method} {path}", e)
+            raise
+        return _ClosingIterator(result, lambda: self._finish(trace, f"{method} {path}"))
+
+    def _finish(self, trace: Trace, label: str, error: BaseException = None):
+        elapsed = trace.elapsed_ms()
+        if self.slow_ms and elapsed >= self.slow_ms:
+            self.logger.warning("slow request: %s took %.0f ms", label, elapsed)
+        self.tracer.finish(trace, error)
+
+
+# -------------------------
+# Exporter (background thread, OTLP/JSON lines)
+# -------------------------
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+def otlp_span(span: Span) -> dict:
+    out = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+    }
+    if span.parent_id:
+        out["parentSpanId"] = span.parent_id
+    if span.status:
+        out["status"] = {"code": span.status[0], "message": span.status[1]}
+    return out
+
+
+class JsonlSpanExporter(BatchWriter):
+    thread_name = "span-exporter"
+
+    def __init__(self, directory: str, service_name: str, batch_size: int = 512,
+                 flush_interval: float = 2.0, queue_size: int = 2000, retention_days: float = 14,
+                 prune_interval: float = 3600.0):
+        """
+        batch_size: spans per written line (at most).
+        queue_size: finished traces waiting for the writer; beyond that new ones are dropped.
+        retention_days: 0 keeps every day file.
+        """
+        super().__init__(batch_size, flush_interval, queue_size)
+        self.directory = directory
+        self.service_name = service_name
+        self.retention = retention_days * 86400
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        self.stats["pruned"] = 0
+
+    def export(self, spans) -> bool:
+        """Queue one trace's spans. Never blocks; returns False if the queue is full."""
+        return self.put(spans)
+
+    def _size(self, spans) -> int:
+        return len(spans)
+
+    def _resource(self) -> dict:
+        return {"attributes": _otlp_attributes({
+            "service.name": self.service_name,
+            "host.name": socket.gethostname(),
+            "process.pid": os.getpid(),
+        })}
+
+    def _write(self, batch):
+        spans = [span for trace_spans in batch for span in trace_spans]
+        line = json.dumps({"resourceSpans": [{
+            "resource": self._resource(),
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [otlp_span(s) for s in spans]}],
+        }]}, ensure_ascii=False, separators=(",", ":"))
+        path = os.path.join(self.directory, time.strftime("spans-%Y%m%d.jsonl"))
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # One write() per line on an O_APPEND file: lines from several workers don't interleave.
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, (line + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+            self.stats["written"] += len(spans)
+        except OSError as e:
+            self.stats["failed"] += len(spans)
+            logger.warning("writing %d span(s) to %s failed: %s", len(spans), path, e)
+
+    def prune(self, now: float = None) -> int:
+        """Deletes day files older than the retention period. Returns how many."""
+        if not self.retention:
+            return 0
+        # Compare file names, not mtimes: spans-YYYYMMDD sorts by day.
+        cutoff = time.strftime("spans-%Y%m%d.jsonl", time.localtime((now or time.time()) - self.retention))
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        removed = 0
+        for name in names:
+            if not _SPAN_FILE_RE.match(name) or name >= cutoff:
+                continue
+            try:
+                os.unlink(os.path.join(self.directory, name))
+                removed += 1
+            except FileNotFoundError:  # another worker got there first
+                pass
+        self.stats["pruned"] += removed
+        return removed
+
+    def _idle(self):
+        if time.monotonic() < self._next_prune:
+            return
+        self._next_prune = time.monotonic() + self.prune_interval
+        try:
+            self.prune()
+        except OSError as e:
+            logger.warning("pruning span files in %s failed: %s", self.directory, e)
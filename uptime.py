@@ -0,0 +1,363 @@
+"""
+uptime.py
+Background uptime prober for the dashboard's site status.
+
+- Probes every configured site concurrently (asyncio, stdlib only) on a background thread.
+- Keeps one keep-alive connection per host in a small pool, so each round is one request per site.
+- Records latency, status code and TLS certificate expiry into a bounded ring buffer per site.
+- After each round an immutable snapshot is published; the dashboard only reads that
+  snapshot, so request time never waits on a remote site.
+- With a state_dir, one prober runs per deployment: the process holding <state_dir>/uptime.lock
+  probes and writes <state_dir>/uptime.json; every other worker serves that file, so all
+  workers show the same numbers and each site gets one probe per interval.
+
+Works against plain http:// URLs too (handy for local stand-in servers).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import ssl
+import tempfile
+import threading
+import time
+from collections import deque, namedtuple
+from urllib.parse import urlsplit
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: no cross-process lock, every process probes on its own
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ProbeResult = namedtuple("ProbeResult", "ts ok status_code latency_ms tls_expires error")
+
+USER_AGENT = "SkyLaneUptime/1.0"
+SPARKLINE_WIDTH = 120
+SPARKLINE_HEIGHT = 24
+
+
+class _Conn:
+    __slots__ = ("reader", "writer", "tls_expires", "reused")
+
+    def __init__(self, reader, writer, tls_expires):
+        self.reader = reader
+        self.writer = writer
+        self.tls_expires = tls_expires
+        self.reused = False
+
+    def usable(self) -> bool:
+        return not (self.reader.at_eof() or self.writer.is_closing())
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Idle keep-alive connections keyed by (scheme, host, port)."""
+
+    def __init__(self, ssl_context=None):
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self._idle = {}
+
+    async def acquire(self, scheme: str, host: str, port: int, timeout: float) -> _Conn:
+        key = (scheme, host, port)
+        conn = self._idle.pop(key, None)
+        if conn is not None and conn.usable():
+            conn.reused = True
+            return conn
+        if conn is not None:
+            conn.close()
+
+        tls = self.ssl_context if scheme == "https" else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=tls, server_hostname=host if tls else None),
+            timeout,
+        )
+        tls_expires = None
+        if tls:
+            ssl_obj = writer.get_extra_info("ssl_object")
+            cert = ssl_obj.getpeercert() if ssl_obj else None
+            if cert and cert.get("notAfter"):
+                tls_expires = ssl.cert_time_to_seconds(cert["notAfter"])
+        return _Conn(reader, writer, tls_expires)
+
+    def release(self, scheme: str, host: str, port: int, conn: _Conn, keep_alive: bool):
+        key = (scheme, host, port)
+        if not keep_alive or not conn.usable():
+            conn.close()
+            return
+        old = self._idle.pop(key, None)
+        if old is not None and old is not conn:
+            old.close()
+        self._idle[key] = conn
+
+    def close(self):
+        for conn in self._idle.values():
+            conn.close()
+        self._idle.clear()
+
+
+async def probe_url(pool: ConnectionPool, url: str, timeout: float) -> ProbeResult:
+    """HEAD the URL once. Any response below 500 counts as "up" (redirects, 405, etc.)."""
+    parts = urlsplit(url)
+    scheme = parts.scheme or "http"
+    host = parts.hostname or ""
+    port = parts.port or (443 if scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+
+    host_header = host if parts.port is None else f"{host}:{parts.port}"
+    request = (
+        f"HEAD {path} HTTP/1.1\r\n"
+        f"Host: {host_header}\r\n"
+        f"User-Agent: {USER_AGENT}\r\n"
+        "Connection: keep-alive\r\n\r\n"
+    ).encode("latin-1")
+
+    started = time.monotonic()
+    ts = time.time()
+    conn = None
+    try:
+        while True:
+            conn = await pool.acquire(scheme, host, port, timeout)
+            try:
+                conn.writer.write(request)
+                await asyncio.wait_for(conn.writer.drain(), timeout)
+                head = await asyncio.wait_for(conn.reader.readuntil(b"\r\n\r\n"), timeout)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server may have dropped an idle keep-alive connection; retry once on a fresh one.
+                conn.close()
+                if not conn.reused:
+                    raise
+                started = time.monotonic()
+        latency_ms = (time.monotonic() - started) * 1000.0
+
+        lines = head.decode("latin-1").split("\r\n")
+        status_code = int(lines[0].split(" ", 2)[1])
+        keep_alive = not any(
+            l.lower().startswith("connection:") and "close" in l.lower() for l in lines[1:]
+        )
+        pool.release(scheme, host, port, conn, keep_alive)
+        return ProbeResult(ts, status_code < 500, status_code, round(latency_ms, 1), conn.tls_expires, None)
+    except Exception as e:
+        if conn is not None:
+            conn.close()
+        latency_ms = (time.monotonic() - started) * 1000.0
+        return ProbeResult(ts, False, None, round(latency_ms, 1), None, f"{type(e).__name__}: {e}".strip(": "))
+
+
+def build_sparkline(latencies, width: int = SPARKLINE_WIDTH, height: int = SPARKLINE_HEIGHT) -> str:
+    """SVG polyline points for a latency series (None = failed probe, drawn at the top)."""
+    if not latencies:
+        return ""
+    values = [v for v in latencies if v is not None]
+    peak = max(values) if values else 1.0
+    peak = peak or 1.0
+    step = width / max(1, len(latencies) - 1)
+    points = []
+    for i, v in enumerate(latencies):
+        y = 0.0 if v is None else height - (v / peak) * (height - 2) - 1
+        points.append(f"{i * step:.1f},{y:.1f}")
+    return " ".join(points)
+
+
+def summarize(history) -> dict:
+    if not history:
+        return {"status": "unknown", "uptime_pct": None, "latency_ms": None,
+                "status_code": None, "tls_days_left": None, "error": None,
+                "checked_at": None, "sparkline": ""}
+
+    last = history[-1]
+    up = sum(1 for r in history if r.ok)
+    tls_expires = next((r.tls_expires for r in reversed(history) if r.tls_expires), None)
+    return {
+        "status": "online" if last.ok else "down",
+        "uptime_pct": round(100.0 * up / len(history), 1),
+        "latency_ms": last.latency_ms if last.ok else None,
+        "status_code": last.status_code,
+        "tls_days_left": int((tls_expires - time.time()) // 86400) if tls_expires else None,
+        "error": last.error,
+        "checked_at": last.ts,
+        "sparkline": build_sparkline([r.latency_ms if r.ok else None for r in history]),
+    }
+
+
+class UptimeProber:
+    def __init__(self, sites, interval: float = 60.0, concurrency: int = 8,
+                 timeout: float = 5.0, history: int = 120, ssl_context=None, state_dir: str = None):
+        """
+        sites: iterable of {"id": ..., "url": ...}
+        state_dir: shared by all worker processes; only the lock holder probes (see module doc).
+        """
+        self.sites = [(s["id"], s["url"]) for s in sites]
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.state_path = os.path.join(state_dir, "uptime.json") if state_dir else None
+        self._lock_path = os.path.join(state_dir, "uptime.lock") if state_dir else None
+        self._lock_file = None
+        self._next_claim = 0.0
+        self._shared = (None, {})  # (mtime_ns, snapshot) of the last state file read
+        self._history = {sid: deque(maxlen=history) for sid, _ in self.sites}
+        self._snapshot = {}
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # -------------------------
+    # Read side (request threads)
+    # -------------------------
+    def snapshot(self) -> dict:
+        """Latest per-site summary. Never blocks; empty until the first round finishes."""
+        if self.state_path is None or self._lock_file is not None:
+            return self._snapshot
+        # Another process probes: serve its last published state (re-read only when it changes).
+        mtime, snapshot = self._shared
+        try:
+            current = os.stat(self.state_path).st_mtime_ns
+            if current != mtime:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)["snapshot"]
+                self._shared = (current, snapshot)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("could not read uptime state %s: %s", self.state_path, e)
+        return snapshot
+
+    # -------------------------
+    # Cross-process state (state_dir)
+    # -------------------------
+    def _claim(self) -> bool:
+        """Takes the deployment-wide prober lock without waiting. True if this process probes."""
+        if self._lock_file is not None or fcntl is None:
+            return True
+        try:
+            os.makedirs(os.path.dirname(self._lock_path), exist_ok=True)
+            f = open(self._lock_path, "a")
+        except OSError as e:
+            logger.warning("could not open uptime lock %s: %s", self._lock_path, e)
+            return False
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        self._load_state()
+        return True
+
+    def _release(self):
+        if self._lock_file is not None:
+            self._lock_file.close()  # drops the flock
+            self._lock_file = None
+
+    def _load_state(self):
+        # A new lock holder carries on from the previous one's history.
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                history = json.load(f).get("history") or {}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("could not read uptime state %s: %s", self.state_path, e)
+            return
+        for site_id, results in history.items():
+            if site_id in self._history:
+                self._history[site_id].extend(ProbeResult(*r) for r in results)
+        self._snapshot = {sid: summarize(list(h)) for sid, h in self._history.items()}
+
+    def _write_state(self):
+        state = {
+            "snapshot": self._snapshot,
+            "history": {sid: [list(r) for r in h] for sid, h in self._history.items()},
+        }
+        directory = os.path.dirname(self.state_path)
+        fd, tmp = tempfile.mkstemp(prefix=".uptime-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            logger.warning("could not write uptime state %s: %s", self.state_path, e)
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    # -------------------------
+    # Probe side (background thread)
+    # -------------------------
+    async def run_once(self, pool: ConnectionPool):
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(site_id, url):
+            async with sem:
+                return site_id, await probe_url(pool, url, self.timeout)
+
+        results = await asyncio.gather(*(one(sid, url) for sid, url in self.sites))
+        for site_id, result in results:
+            self._history[site_id].append(result)
+
+        # Publish a fresh dict; readers holding the old one are unaffected.
+        self._snapshot = {sid: summarize(list(h)) for sid, h in self._history.items()}
+        if self.state_path is not None:
+            self._write_state()
+
+    async def _run(self):
+        pool = ConnectionPool(self.ssl_context)
+        try:
+            while not self._stop.is_set():
+                started = time.monotonic()
+                try:
+                    await self.run_once(pool)
+                except Exception as e:
+                    logger.warning("probe round failed: %s", e)
+                delay = max(0.0, self.interval - (time.monotonic() - started))
+                await asyncio.get_running_loop().run_in_executor(None, self._stop.wait, delay)
+        finally:
+            pool.close()
+
+    def start(self):
+        # Called on every request: concurrent first requests must not start two loops.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self.state_path is not None and time.monotonic() < self._next_claim:
+            return  # another process holds the lock; try again once per interval
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self.state_path is not None and not self._claim():
+                self._next_claim = time.monotonic() + self.interval
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=lambda: asyncio.run(self._run()),
+                                            name="uptime-prober", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._release()
+
+    def probe_now(self) -> dict:
+        """Run a single round synchronously (tests / CLI)."""
+        async def _once():
+            pool = ConnectionPool(self.ssl_context)
+            try:
+                await self.run_once(pool)
+            finally:
+                pool.close()
+        asyncio.run(_once())
+        return self._snapshot